@@ -1,10 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.metrics import get_metrics
 from src.config.logging import logger  
 from src.config.setup import * 
+from collections import deque
+from typing import Iterator
+from typing import Optional
 import pandas as pd
-import json 
 import os
 
 
+# Number of CSV rows read into memory at a time when streaming the input file
+READ_CHUNK_ROWS = 50000
+
+
 def load_dataframe(file_path: str) -> pd.DataFrame:
     """
     Load a DataFrame from a CSV file.
@@ -24,7 +32,27 @@ def load_dataframe(file_path: str) -> pd.DataFrame:
         raise
 
 
-def save_chunk_rows_as_jsonl(df_chunk: pd.DataFrame, filename: str) -> None:
+def iter_dataframe_chunks(file_path: str, chunk_rows: int = READ_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Lazily read a CSV file as a sequence of DataFrames.
+
+    Parameters:
+    - file_path (str): The path to the CSV file.
+    - chunk_rows (int, optional): The number of rows per DataFrame. Default is 50,000.
+
+    Returns:
+    - Iterator[pd.DataFrame]: The CSV contents, one chunk at a time.
+    """
+    try:
+        reader = pd.read_csv(file_path, chunksize=chunk_rows)
+        logger.info(f"Streaming DataFrame chunks from {file_path}")
+        return reader
+    except Exception as e:
+        logger.error(f"Failed to open {file_path} for chunked reading: {e}")
+        raise
+
+
+def save_chunk_rows_as_jsonl(df_chunk: pd.DataFrame, filename: str) -> bool:
     """
     Save rows from DataFrame chunk to a JSON Lines file.
 
@@ -33,15 +61,21 @@ def save_chunk_rows_as_jsonl(df_chunk: pd.DataFrame, filename: str) -> None:
     - filename (str): The output filename to save the rows in JSON Lines format.
 
     Returns:
-    - None
+    - bool: True if the file was written, False if writing failed.
     """
     try:
-        with open(filename, 'w', encoding='utf-8') as file:
-            for _, row in df_chunk.iterrows():
-                file.write(json.dumps(row.to_dict(), ensure_ascii=False) + '\n')  # Serialize row to JSON and write
+        with get_metrics().track("batch.write_jsonl"):
+            # Serialize the whole chunk at once instead of row by row
+            content = df_chunk.to_json(orient='records', lines=True, force_ascii=False)
+            if content and not content.endswith('\n'):
+                content += '\n'
+            with open(filename, 'w', encoding='utf-8') as file:
+                file.write(content)
         logger.info(f"Rows successfully saved to {filename} in JSON Lines format")
+        return True
     except Exception as e:
         logger.error(f"Failed to save chunk rows as JSON Lines: {e}")
+        return False
 
 
 def process_dataframe_chunks(df: pd.DataFrame, output_dir: str, chunk_size: int = 50) -> None:
@@ -60,4 +94,52 @@ def process_dataframe_chunks(df: pd.DataFrame, output_dir: str, chunk_size: int
     for start_row in range(0, df.shape[0], chunk_size):
         df_chunk = df.iloc[start_row:start_row + chunk_size]
         filename = f"{output_dir}/batch_{start_row + 1}_{start_row + df_chunk.shape[0]}.jsonl"
-        save_chunk_rows_as_jsonl(df_chunk, filename)
\ No newline at end of file
+        save_chunk_rows_as_jsonl(df_chunk, filename)
+
+
+def process_csv_in_chunks(file_path: str, output_dir: str, chunk_size: int = 50, max_workers: Optional[int] = None,
+                          read_chunk_rows: int = READ_CHUNK_ROWS) -> int:
+    """
+    Split a CSV file into JSON Lines batch files without loading it into memory.
+
+    The CSV is read in large chunks, each chunk is cut into batches of `chunk_size` rows, and the
+    batch files are written on a thread pool. At most a few read chunks are held in memory at once.
+    File names match `process_dataframe_chunks`.
+
+    Parameters:
+    - file_path (str): The path to the CSV file.
+    - output_dir (str): The directory where output files will be saved.
+    - chunk_size (int, optional): The number of rows per batch file. Default is 50.
+    - max_workers (int, optional): The number of concurrent file writers. Defaults to `split_max_workers` from the config.
+    - read_chunk_rows (int, optional): The number of CSV rows read at a time, rounded to a multiple of `chunk_size`.
+
+    Returns:
+    - int: The number of batch files written. Files that failed to write are logged and not counted.
+    """
+    max_workers = max_workers or config.SPLIT_MAX_WORKERS
+    os.makedirs(output_dir, exist_ok=True)
+    read_chunk_rows = max(read_chunk_rows // chunk_size, 1) * chunk_size
+    pending = deque()
+    offset = 0
+    submitted = 0
+    written = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for df in iter_dataframe_chunks(file_path, read_chunk_rows):
+            for start_row in range(0, df.shape[0], chunk_size):
+                df_chunk = df.iloc[start_row:start_row + chunk_size]
+                first_row = offset + start_row + 1
+                filename = f"{output_dir}/batch_{first_row}_{first_row + df_chunk.shape[0] - 1}.jsonl"
+                pending.append(executor.submit(save_chunk_rows_as_jsonl, df_chunk, filename))
+                submitted += 1
+            offset += df.shape[0]
+            # Bound memory by waiting for older writes before reading further
+            while len(pending) > max_workers * (read_chunk_rows // chunk_size):
+                written += pending.popleft().result()
+        for future in pending:
+            written += future.result()
+
+    if written < submitted:
+        logger.error(f"{submitted - written} of {submitted} batch files failed to write to {output_dir}.")
+    logger.info(f"{written} batch files written to {output_dir} from {offset} rows.")
+    return written
@@ -1,39 +1,81 @@
+from google.api_core.exceptions import NotFound
+from src.utils.gcp import get_storage_client
+from src.utils.metrics import get_metrics
 from src.config.logging import logger
 from google.cloud import storage
 from src.config.setup import *
 from datetime import datetime
 from datetime import timezone
 from typing import Generator
+from typing import Optional
 from typing import Dict
+from typing import List
 from typing import Any 
 import json 
+import re
+
+
+# Object holding the manifest of the most recent run
+LATEST_POINTER = "LATEST"
+# Bytes fetched per request when streaming a blob
+READ_CHUNK_SIZE = 1024 * 1024
+RUN_FOLDER_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}/$")
+
+
+def write_latest_pointer(bucket_name: str, folder: str, files: Optional[List[str]] = None) -> None:
+    """
+    Records `folder` as the most recent run by writing a small manifest to the `LATEST` object.
+
+    Args:
+    - bucket_name: The GCS bucket name.
+    - folder: The run folder, e.g. '2024-03-01_12-00-00'.
+    - files: The file names uploaded in this run.
+    """
+    manifest = {
+        "folder": f"{folder.rstrip('/')}/",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "files": files or []
+    }
+    blob = get_storage_client().bucket(bucket_name).blob(LATEST_POINTER)
+    with get_metrics().track("gcs.write_latest"):
+        blob.upload_from_string(json.dumps(manifest), content_type="application/json")
+    logger.info(f"Latest run pointer set to {manifest['folder']}.")
 
 
 def find_most_recent_folder(bucket_name: str):
-    """Find the most recent 'folder' in a GCS bucket."""
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    prefixes = set()  # To store unique 'folder' prefixes
-    most_recent_prefix = None
-    most_recent_time = datetime.min.replace(tzinfo=timezone.utc)  # Make it timezone-aware
+    """
+    Find the most recent 'folder' in a GCS bucket.
 
+    The `LATEST` manifest written at upload time is read first. Buckets written before the
+    manifest existed fall back to the newest timestamped top-level prefix by name.
+    """
+    bucket = get_storage_client().bucket(bucket_name)
+
+    metrics = get_metrics()
     try:
-        blobs = bucket.list_blobs(delimiter='/')
-        for page in blobs.pages:
-            for prefix in page.prefixes:
-                prefixes.add(prefix)
-        
-        for prefix in prefixes:
-            # Fetch the blob that corresponds to the 'folder' to get its creation time
-            blobs = list(storage_client.list_blobs(bucket_name, prefix=prefix, delimiter='/'))
-            if blobs:
-                creation_time = max(blob.time_created for blob in blobs)
-                if creation_time > most_recent_time:
-                    most_recent_time = creation_time
-                    most_recent_prefix = prefix
-
-        if most_recent_prefix:
-            return most_recent_prefix
+        with metrics.track("gcs.read_latest"):
+            manifest = json.loads(bucket.blob(LATEST_POINTER).download_as_text())
+        return manifest["folder"]
+    except NotFound:
+        logger.info("No latest run pointer found, falling back to prefix listing.")
+    except (ValueError, KeyError) as e:
+        logger.error(f"Invalid latest run pointer, falling back to prefix listing: {e}")
+    except Exception as e:
+        logger.error(f"Failed to find the most recent folder: {e}")
+        return None
+
+    try:
+        prefixes = set()  # To store unique 'folder' prefixes
+        with metrics.track("gcs.list_prefixes"):
+            blobs = bucket.list_blobs(delimiter='/')
+            for page in blobs.pages:
+                for prefix in page.prefixes:
+                    if RUN_FOLDER_PATTERN.match(prefix):
+                        prefixes.add(prefix)
+
+        if prefixes:
+            # Run folders are named '%Y-%m-%d_%H-%M-%S/', so name order is time order
+            return max(prefixes)
         else:
             logger.info("No folders found in the bucket.")
             return None
@@ -62,7 +104,7 @@ def extract_batch_id(filepath: str) -> str:
 
 def list_blobs_with_prefix(bucket_name: str, prefix: str, delimiter=None) -> Generator[storage.Blob, None, None]:
     """Yield Google Cloud Storage Blob objects in the bucket with a given prefix."""
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
     blobs = storage_client.list_blobs(bucket_name, prefix=prefix, delimiter=delimiter)
 
     for blob in blobs:
@@ -72,18 +114,29 @@ def list_blobs_with_prefix(bucket_name: str, prefix: str, delimiter=None) -> Gen
             
 
 def parse_blob_contents(blob: storage.Blob, bucket_name: str) -> Generator[Dict[str, Any], None, None]:
-    """Yield dictionaries from a JSONL file represented by a Blob object."""
-    # Download the blob's contents as text
-    blob_as_text = blob.download_as_text()
-    for line in blob_as_text.splitlines():
-        try:
-            # Parse each line as JSON and yield the resulting dictionary
-            batch_id = extract_batch_id(blob.name)
-
-            info = json.loads(line)
-            info['batch_id'] = batch_id
-            info['cloud_storage_uri'] = f'gs://{bucket_name}/{blob.name}'
-            
-            yield info
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing JSON from blob {blob.name}: {e}")
\ No newline at end of file
+    """
+    Yield dictionaries from a JSONL file represented by a Blob object.
+
+    The blob is read through its streaming reader one line at a time, so memory use does
+    not grow with the size of the file.
+    """
+    batch_id = extract_batch_id(blob.name)
+    cloud_storage_uri = f'gs://{bucket_name}/{blob.name}'
+    metrics = get_metrics()
+    metrics.inc("calls", "batch.parse_blob")
+
+    with blob.open("r", encoding="utf-8", chunk_size=READ_CHUNK_SIZE) as reader:
+        for line in reader:
+            if not line.strip():
+                continue
+            try:
+                # Parse each line as JSON and yield the resulting dictionary
+                info = json.loads(line)
+                info['batch_id'] = batch_id
+                info['cloud_storage_uri'] = cloud_storage_uri
+
+                metrics.inc("rows", "batch.parse_blob")
+                yield info
+            except json.JSONDecodeError as e:
+                metrics.record_error("batch.parse_blob")
+                logger.error(f"Error parsing JSON from blob {blob.name}: {e}")
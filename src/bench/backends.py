@@ -0,0 +1,562 @@
+from google.cloud.discoveryengine_v1beta.services.search_service.pagers import SearchAsyncPager
+from google.cloud import discoveryengine_v1beta as discoveryengine
+from http.server import ThreadingHTTPServer
+from http.server import BaseHTTPRequestHandler
+from google.api_core.exceptions import NotFound
+from google.api_core.exceptions import ServiceUnavailable
+from src.utils.db import create_engine_with_connection_pool
+from src.search.site_search import set_async_search_client
+from src.utils.access import set_token_provider
+from src.utils.gcp import set_storage_client
+from src.db.match import clear_lookup_cache
+from src.utils.access import FileTokenSource
+from src.utils.rest import set_rest_client
+from src.utils.access import TokenProvider
+from sqlalchemy.engine.base import Engine
+from src.config.logging import logger
+from src.utils.db import set_engine
+from src.config.setup import config
+from urllib.parse import urlparse
+from urllib.parse import parse_qs
+from datetime import datetime
+from datetime import timezone
+from collections import Counter
+from types import SimpleNamespace
+from typing import Optional
+from typing import Iterator
+from typing import Tuple
+from typing import List
+from typing import Dict
+from typing import Any
+import threading
+import asyncio
+import hashlib
+import random
+import base64
+import shutil
+import time
+import json
+import io
+import os
+
+
+class LatencyModel:
+    """
+    Injects a fixed delay and a random failure rate into a fake backend.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        """
+        Args:
+            latency (float): Seconds added to every call.
+            error_rate (float): Fraction of calls that fail, between 0 and 1.
+            seed (int): Seed for the failure sequence, so runs are comparable.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def apply(self) -> bool:
+        """
+        Sleeps for the configured latency.
+
+        Returns:
+            bool: True if this call should fail.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        return self.fails()
+
+    async def apply_async(self) -> bool:
+        """
+        Awaits the configured latency without blocking the event loop.
+
+        Returns:
+            bool: True if this call should fail.
+        """
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.fails()
+
+    def fails(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+class LocalBlob:
+    """
+    Filesystem-backed stand-in for `google.cloud.storage.Blob`.
+    """
+
+    def __init__(self, bucket: "LocalBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.bucket.root, self.name)
+
+    @property
+    def md5_hash(self) -> Optional[str]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as file:
+            return base64.b64encode(hashlib.md5(file.read()).digest()).decode("utf-8")
+
+    @property
+    def time_created(self) -> datetime:
+        return datetime.fromtimestamp(os.path.getmtime(self.path), tz=timezone.utc)
+
+    def upload_from_filename(self, filename: str, **kwargs: Any) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        shutil.copyfile(filename, self.path)
+
+    def upload_from_string(self, data: Any, content_type: Optional[str] = None, **kwargs: Any) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        mode = "wb" if isinstance(data, bytes) else "w"
+        with open(self.path, mode) as file:
+            file.write(data)
+
+    def download_as_text(self, encoding: str = "utf-8", **kwargs: Any) -> str:
+        if not os.path.exists(self.path):
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+        with open(self.path, "r", encoding=encoding) as file:
+            return file.read()
+
+    def open(self, mode: str = "r", encoding: Optional[str] = None, chunk_size: Optional[int] = None, **kwargs: Any) -> io.IOBase:
+        if not os.path.exists(self.path):
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+        if "b" in mode:
+            return open(self.path, mode)
+        return open(self.path, mode, encoding=encoding or "utf-8")
+
+    def delete(self, **kwargs: Any) -> None:
+        batch = self.bucket.client.current_batch
+        if not os.path.exists(self.path):
+            if batch is not None:
+                batch.record(404)
+                return
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+        os.remove(self.path)
+        if batch is not None:
+            batch.record(204)
+
+
+class LocalPage(list):
+    """
+    One page of a listing, carrying the 'folder' prefixes found when a delimiter is used.
+    """
+
+    def __init__(self, blobs: List[LocalBlob], prefixes: set):
+        super().__init__(blobs)
+        self.prefixes = prefixes
+
+
+class LocalBlobIterator:
+    """
+    Stand-in for the paged iterator returned by `list_blobs`.
+    """
+
+    def __init__(self, bucket: "LocalBucket", prefix: str = "", delimiter: Optional[str] = None, page_size: int = 1000):
+        self.bucket = bucket
+        self.prefix = prefix or ""
+        self.delimiter = delimiter
+        self.page_size = page_size
+        self.prefixes = set()
+
+    def _walk(self) -> Iterator[str]:
+        for directory, _, files in os.walk(self.bucket.root):
+            for filename in files:
+                name = os.path.relpath(os.path.join(directory, filename), self.bucket.root).replace(os.sep, "/")
+                if name.startswith(self.prefix):
+                    yield name
+
+    @property
+    def pages(self) -> Iterator[LocalPage]:
+        blobs = []
+        prefixes = set()
+        for name in sorted(self._walk()):
+            rest = name[len(self.prefix):]
+            if self.delimiter and self.delimiter in rest:
+                prefixes.add(self.prefix + rest.split(self.delimiter)[0] + self.delimiter)
+                continue
+            blobs.append(LocalBlob(self.bucket, name))
+            if len(blobs) == self.page_size:
+                yield LocalPage(blobs, set())
+                blobs = []
+        self.prefixes = prefixes
+        yield LocalPage(blobs, prefixes)
+
+    def __iter__(self) -> Iterator[LocalBlob]:
+        for page in self.pages:
+            yield from page
+
+
+class LocalBucket:
+    """
+    Filesystem-backed stand-in for `google.cloud.storage.Bucket`.
+    """
+
+    def __init__(self, client: "LocalStorageClient", name: str):
+        self.client = client
+        self.name = name
+        self.root = os.path.join(client.root, name)
+        os.makedirs(self.root, exist_ok=True)
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def list_blobs(self, prefix: Optional[str] = None, delimiter: Optional[str] = None, page_size: int = 1000, **kwargs: Any) -> LocalBlobIterator:
+        return LocalBlobIterator(self, prefix, delimiter, page_size)
+
+    def copy_blob(self, blob: LocalBlob, destination_bucket: "LocalBucket", new_name: Optional[str] = None, **kwargs: Any) -> LocalBlob:
+        destination = destination_bucket.blob(new_name or blob.name)
+        destination.upload_from_filename(blob.path)
+        return destination
+
+
+class LocalBatch:
+    """
+    Stand-in for `google.cloud.storage.batch.Batch`. Deletes made inside it happen immediately,
+    and the status of each is kept in `_responses` like the sub-responses of a GCS batch.
+    """
+
+    def __init__(self, client: "LocalStorageClient", raise_exception: bool = True):
+        self.client = client
+        self.raise_exception = raise_exception
+        self._responses = []
+
+    def record(self, status_code: int) -> None:
+        self._responses.append(SimpleNamespace(status_code=status_code))
+
+    def __enter__(self) -> "LocalBatch":
+        self.client.current_batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.client.current_batch = None
+        failed = [response for response in self._responses if not 200 <= response.status_code < 300]
+        if exc_type is None and failed and self.raise_exception:
+            raise NotFound(f"{len(failed)} deletions in the batch failed")
+
+
+class LocalStorageClient:
+    """
+    Filesystem-backed stand-in for `google.cloud.storage.Client`. Each bucket is a directory under `root`.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.current_batch = None
+        os.makedirs(root, exist_ok=True)
+
+    def bucket(self, bucket_name: str) -> LocalBucket:
+        return LocalBucket(self, bucket_name)
+
+    def list_blobs(self, bucket_name: str, prefix: Optional[str] = None, delimiter: Optional[str] = None, **kwargs: Any) -> LocalBlobIterator:
+        return self.bucket(bucket_name).list_blobs(prefix=prefix, delimiter=delimiter, **kwargs)
+
+    def batch(self, raise_exception: bool = True) -> LocalBatch:
+        return LocalBatch(self, raise_exception)
+
+
+def create_sqlite_engine(path: str) -> Engine:
+    """
+    Creates a SQLAlchemy engine for a local SQLite database standing in for Cloud SQL.
+
+    Args:
+        path (str): The database file.
+
+    Returns:
+        Engine: The engine.
+    """
+    return create_engine_with_connection_pool(f"sqlite:///{path}")
+
+
+class FakeDiscoveryEngineServer:
+    """
+    Local HTTP server answering the Discovery Engine REST calls made by `src/search`.
+
+    Data stores, engines and target sites are kept in memory. Every request goes
+    through the latency model, and injected failures are answered with 503.
+    """
+
+    def __init__(self, latency_model: Optional[LatencyModel] = None, max_target_sites: int = 20):
+        self.latency_model = latency_model or LatencyModel()
+        self.max_target_sites = max_target_sites
+        self.data_stores = {}
+        self.engines = {}
+        self.target_sites = Counter()
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeDiscoveryEngineServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def _route_name(route: str) -> str:
+        """Names a route by its collections, e.g. `dataStores/{id}/siteSearchEngine/targetSites:batchCreate`."""
+        parts = route.split("/")
+        return "/".join("{id}" if i and parts[i - 1] in ("dataStores", "engines") else part for i, part in enumerate(parts))
+
+    def _handle(self, method: str, path: str, query: Dict[str, List[str]], body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        prefix = "/locations/global/collections/default_collection/"
+        route = path.split(prefix, 1)[1] if prefix in path else path
+        with self._lock:
+            self.calls[f"{method} {self._route_name(route)}"] += 1
+
+        if self.latency_model.apply():
+            return 503, {"error": {"code": 503, "message": "Injected failure"}}
+
+        with self._lock:
+            if method == "POST" and route == "dataStores":
+                data_store_id = query["dataStoreId"][0]
+                if data_store_id in self.data_stores:
+                    return 409, {"error": {"code": 409, "message": "Already exists"}}
+                self.data_stores[data_store_id] = body
+                return 200, {"name": f"operations/create-data-store-{data_store_id}"}
+            if method == "POST" and route == "engines":
+                engine_id = query["engineId"][0]
+                if engine_id in self.engines:
+                    return 409, {"error": {"code": 409, "message": "Already exists"}}
+                self.engines[engine_id] = body
+                return 200, {"name": f"operations/create-engine-{engine_id}"}
+            if method == "POST" and route.endswith("targetSites:batchCreate"):
+                requests_list = body.get("requests", [])
+                if len(requests_list) > self.max_target_sites:
+                    return 400, {"error": {"code": 400, "message": "Too many target sites"}}
+                self.target_sites[route.split("/")[1]] += len(requests_list)
+                return 200, {"name": "operations/batch-create-target-sites"}
+            if method == "GET" and route == "dataStores":
+                return 200, {"dataStores": [{"name": f"{path}/{k}", **v} for k, v in self.data_stores.items()]}
+            if method == "GET" and route == "engines":
+                return 200, {"engines": [{"name": f"{path}/{k}", **v} for k, v in self.engines.items()]}
+            if method == "DELETE":
+                resource_id = route.rsplit("/", 1)[-1]
+                self.data_stores.pop(resource_id, None)
+                self.engines.pop(resource_id, None)
+                return 200, {}
+        return 404, {"error": {"code": 404, "message": f"Unknown route {method} {path}"}}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, method: str) -> None:
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                status, payload = server._handle(method, parsed.path, parse_qs(parsed.query), body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def do_DELETE(self):
+                self._respond("DELETE")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class FakePdfServer:
+    """
+    Local HTTP server of synthetic PDFs at `/<name>.pdf`, for the download stage. Each file has a
+    strong ETag and a Last-Modified date, and conditional (If-None-Match) and range (Range with
+    If-Range) requests are answered like a typical static file server. Every request goes
+    through the latency model, and injected failures are answered with 503.
+    """
+
+    LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+    def __init__(self, latency_model: Optional[LatencyModel] = None, size: int = 256 * 1024):
+        """
+        Args:
+            latency_model (Optional[LatencyModel]): Delay and failure injection per request.
+            size (int): The size of every file in bytes.
+        """
+        self.latency_model = latency_model or LatencyModel()
+        self.size = size
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, name: str) -> str:
+        return f"{self.endpoint}/{name}.pdf"
+
+    def start(self) -> "FakePdfServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _content(self, path: str) -> bytes:
+        seed = hashlib.sha256(path.encode("utf-8")).digest()
+        return (b"%PDF-1.4\n" + seed * (self.size // len(seed) + 1))[:self.size]
+
+    def _handle(self, path: str, headers: Any) -> Tuple[int, Dict[str, str], bytes]:
+        if self.latency_model.apply():
+            return 503, {}, b""
+        content = self._content(path)
+        etag = f'"{hashlib.md5(content).hexdigest()}"'
+        validators = {"ETag": etag, "Last-Modified": self.LAST_MODIFIED}
+        if headers.get("If-None-Match") == etag:
+            return 304, validators, b""
+
+        range_header = headers.get("Range", "")
+        if_range = headers.get("If-Range")
+        if range_header.startswith("bytes=") and if_range in (None, etag, self.LAST_MODIFIED):
+            start = int(range_header[len("bytes="):].split("-", 1)[0])
+            if start >= len(content):
+                return 416, {"Content-Range": f"bytes */{len(content)}"}, b""
+            return 206, {**validators, "Content-Range": f"bytes {start}-{len(content) - 1}/{len(content)}"}, content[start:]
+        return 200, validators, content
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, headers, data = server._handle(urlparse(self.path).path, self.headers)
+                with server._lock:
+                    server.calls[status] += 1
+                self.send_response(status)
+                self.send_header("Content-Type", "application/pdf")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class FakeAsyncSearchClient:
+    """
+    Stand-in for `SearchServiceAsyncClient` returning synthetic, paginated search results wrapped
+    in a pager like the real client. Latency is awaited, so many searches can overlap on one event loop.
+    """
+
+    def __init__(self, latency_model: Optional[LatencyModel] = None, hits_per_query: int = 10):
+        """
+        Args:
+            latency_model (Optional[LatencyModel]): Delay and failure injection per call.
+            hits_per_query (int): Total results available for every query.
+        """
+        self.latency_model = latency_model or LatencyModel()
+        self.hits_per_query = hits_per_query
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    async def search(self, request: discoveryengine.SearchRequest, **kwargs: Any) -> SearchAsyncPager:
+        return SearchAsyncPager(self._search_page, request, await self._search_page(request))
+
+    async def _search_page(self, request: discoveryengine.SearchRequest, **kwargs: Any) -> discoveryengine.SearchResponse:
+        with self._lock:
+            self.calls += 1
+        if await self.latency_model.apply_async():
+            raise ServiceUnavailable("Injected failure")
+        return self._respond(request)
+
+    def _respond(self, request: discoveryengine.SearchRequest) -> discoveryengine.SearchResponse:
+        start = int(request.page_token or 0)
+        end = min(start + (request.page_size or 10), self.hits_per_query)
+        digest = hashlib.md5(request.query.encode("utf-8")).hexdigest()[:8]
+        results = [
+            discoveryengine.SearchResponse.SearchResult(
+                id=f"{digest}-{i}",
+                document=discoveryengine.Document(
+                    id=f"{digest}-{i}",
+                    derived_struct_data={
+                        "title": f"Result {i} for {request.query[:40]}",
+                        "link": f"https://example.org/{digest}/{i}.pdf",
+                        "snippets": [{"snippet": f"Snippet {i} ...", "snippet_status": "SUCCESS"}],
+                    },
+                ),
+            )
+            for i in range(start, end)
+        ]
+        return discoveryengine.SearchResponse(
+            results=results,
+            total_size=self.hits_per_query,
+            next_page_token=str(end) if end < self.hits_per_query else "",
+        )
+
+
+def install_local_backends(workdir: str, latency_model: Optional[LatencyModel] = None) -> Dict[str, Any]:
+    """
+    Points the pipelines at local stand-ins: a directory-backed bucket, a SQLite database,
+    a fake Discovery Engine REST server and a fake search client. A file-backed token
+    provider replaces `gcloud`. A fake PDF server is started for the download stage.
+
+    Args:
+        workdir (str): Directory for the bucket, database and token file.
+        latency_model (Optional[LatencyModel]): Delay and failure injection for the fake Discovery Engine and PDF server.
+
+    Returns:
+        Dict[str, Any]: The installed backends, keyed by 'storage', 'engine', 'server', 'search' and 'pdf'.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    token_path = os.path.join(workdir, "token")
+    with open(token_path, "w") as file:
+        file.write("local-benchmark-token")
+    set_token_provider(TokenProvider(FileTokenSource(token_path), background_refresh=False))
+
+    storage_client = LocalStorageClient(os.path.join(workdir, "gcs"))
+    set_storage_client(storage_client)
+
+    engine = create_sqlite_engine(os.path.join(workdir, "entity_urls.sqlite"))
+    set_engine(engine)
+    clear_lookup_cache()
+
+    server = FakeDiscoveryEngineServer(latency_model).start()
+    config.DISCOVERY_ENGINE_ENDPOINT = server.endpoint
+    set_rest_client(None)
+
+    search_client = FakeAsyncSearchClient(latency_model)
+    set_async_search_client(search_client)
+
+    pdf_server = FakePdfServer(latency_model).start()
+
+    logger.info(f"Local benchmark backends installed under {workdir}.")
+    return {"storage": storage_client, "engine": engine, "server": server, "search": search_client, "pdf": pdf_server}
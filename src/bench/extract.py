@@ -0,0 +1,134 @@
+from google.cloud import discoveryengine_v1beta as discoveryengine
+from src.search.site_search import fetch_search_page_async
+from src.search.extract import extract_hits
+from google.protobuf import json_format
+from src.utils.aio import run_sync
+from typing import Optional
+from pathlib import Path
+from typing import List
+from typing import Dict
+from typing import Any
+import argparse
+import timeit
+import json
+import sys
+
+
+# Search responses in the JSON form of `SearchResponse`. The `synthetic_*` ones are hand-built from the
+# titles and links in data/results.csv; record real ones from a batch data store with --record.
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+DEFAULT_NUMBER = 2000
+DEFAULT_REPEAT = 5
+
+
+def extract_with_message_to_dict(response: discoveryengine.SearchResponse) -> List[Dict[str, str]]:
+    """
+    The previous extraction, converting every document to a dict before picking its fields.
+    Kept as the reference the projection is checked and timed against.
+    """
+    extracted_data = []
+    for result in response.results:
+        derived_struct_data = json_format.MessageToDict(result.document._pb).get('derivedStructData', {})
+        snippets = derived_struct_data.get("snippets")
+        extracted_data.append({
+            "title": derived_struct_data.get("title") or "",
+            "snippet": (snippets[0].get('snippet') or "") if snippets else "",
+            "link": derived_struct_data.get("link") or "",
+        })
+    return extracted_data
+
+
+def extract_with_projection(response: discoveryengine.SearchResponse) -> List[Dict[str, str]]:
+    """The extraction used by the search module: `extract_hits`, converted to dicts."""
+    return [hit.to_dict() for hit in extract_hits(response)]
+
+
+def load_fixture(path: Path) -> discoveryengine.SearchResponse:
+    return discoveryengine.SearchResponse.from_json(path.read_text(), ignore_unknown_fields=True)
+
+
+def record_fixture(search_query: str, data_store_id: str, path: Path, page_size: int = 10) -> Path:
+    """
+    Searches a data store and saves the first page of results as a fixture.
+
+    Args:
+        search_query (str): The search query string.
+        data_store_id (str): The data store to search, e.g. a batch ID.
+        path (Path): Where to write the response.
+        page_size (int): The number of results to request.
+
+    Returns:
+        Path: The written fixture.
+    """
+    response = run_sync(fetch_search_page_async(search_query, data_store_id, page_size))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(discoveryengine.SearchResponse.to_json(response))
+    return path
+
+
+def time_extractor(extractor, response: discoveryengine.SearchResponse, number: int, repeat: int) -> float:
+    """Returns the best time of one extraction, in microseconds."""
+    timings = timeit.repeat(lambda: extractor(response), number=number, repeat=repeat)
+    return min(timings) / number * 1e6
+
+
+def benchmark_fixture(path: Path, number: int, repeat: int) -> Dict[str, Any]:
+    """
+    Checks that both extractions agree on a fixture and times them.
+
+    Args:
+        path (Path): The response fixture.
+        number (int): Extractions per timing.
+        repeat (int): Timings, of which the best is kept.
+
+    Returns:
+        Dict[str, Any]: The number of results, the time per response of each extraction and the speedup.
+
+    Raises:
+        AssertionError: If the extractions return different results.
+    """
+    response = load_fixture(path)
+    expected = extract_with_message_to_dict(response)
+    actual = extract_with_projection(response)
+    assert actual == expected, f"Extractions differ on {path.name}: {actual} != {expected}"
+
+    message_to_dict_us = time_extractor(extract_with_message_to_dict, response, number, repeat)
+    projection_us = time_extractor(extract_with_projection, response, number, repeat)
+    hits_us = time_extractor(extract_hits, response, number, repeat)
+    return {
+        "fixture": path.name,
+        "results": len(expected),
+        "message_to_dict_us": round(message_to_dict_us, 2),
+        "projection_us": round(projection_us, 2),
+        "hits_us": round(hits_us, 2),
+        "speedup": round(message_to_dict_us / projection_us, 1) if projection_us else None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Time search result extraction on saved search responses.")
+    parser.add_argument("fixtures", nargs="*", help="Response fixtures. Defaults to src/bench/fixtures/*.json.")
+    parser.add_argument("--record", nargs=3, metavar=("QUERY", "DATA_STORE_ID", "NAME"),
+                        help="Search a data store and save the response as src/bench/fixtures/NAME.json first.")
+    parser.add_argument("--number", type=int, default=DEFAULT_NUMBER, help="Extractions per timing.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timings per extraction, the best is kept.")
+    parser.add_argument("--output", help="Where to write the JSON results.")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        search_query, data_store_id, name = args.record
+        print(f"Recorded {record_fixture(search_query, data_store_id, FIXTURES_DIR / f'{name}.json')}")
+    paths = [Path(path) for path in args.fixtures] or sorted(FIXTURES_DIR.glob("*.json"))
+    results = [benchmark_fixture(path, args.number, args.repeat) for path in paths]
+    for result in results:
+        print(f"{result['fixture']}: {result['results']} results, MessageToDict {result['message_to_dict_us']}us, "
+              f"projection {result['projection_us']}us ({result['speedup']}x), hits only {result['hits_us']}us")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+from statistics import median
+from typing import Optional
+from typing import List
+from typing import Dict
+from typing import Any
+import subprocess
+import argparse
+import json
+import sys
+
+
+# Modules whose import time is budgeted: the entry points and the modules they pull in
+DEFAULT_MODULES = [
+    "src.config.setup",
+    "src.utils.metrics",
+    "src.utils.db",
+    "src.db.match",
+    "src.search.site_search",
+    "src.run.query_pipeline",
+    "src.run.index_pipeline",
+    "src.run.clean_pipeline",
+]
+# Default budget for importing one module in a fresh interpreter, in milliseconds
+DEFAULT_BUDGET_MS = 2000
+DEFAULT_REPEAT = 5
+
+# Run in a fresh interpreter: imports the module, then checks that nothing was initialized eagerly
+PROBE = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module({module!r})
+seconds = time.perf_counter() - start
+from src.config.setup import config
+import src.utils.db as db
+import src.utils.access as access
+print(json.dumps({{
+    "seconds": seconds,
+    "config_loaded": config.loaded,
+    "connector_created": db._connector is not None,
+    "engine_created": db._engine is not None,
+    "token_provider_created": access._provider is not None,
+}}))
+"""
+
+
+def measure_import(module: str, repeat: int = DEFAULT_REPEAT) -> Dict[str, Any]:
+    """
+    Imports a module in `repeat` fresh interpreters and records the median import time and
+    whether the import loaded the configuration or created a token provider, connector or engine.
+
+    Args:
+        module (str): The module to import.
+        repeat (int): The number of fresh interpreters.
+
+    Returns:
+        Dict[str, Any]: The module, median and maximum milliseconds, and the side-effect flags of the last run.
+    """
+    timings = []
+    probe = {}
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", PROBE.format(module=module)],
+                                capture_output=True, text=True, check=True).stdout
+        probe = json.loads(output.strip().splitlines()[-1])
+        timings.append(probe.pop("seconds") * 1000)
+    return {"module": module, "median_ms": round(median(timings), 1), "max_ms": round(max(timings), 1), **probe}
+
+
+def check_budget(results: List[Dict[str, Any]], budget_ms: float) -> List[str]:
+    """
+    Lists the violations of the startup budget: slow imports and imports with side effects.
+
+    Args:
+        results (List[Dict[str, Any]]): The results of `measure_import`.
+        budget_ms (float): The allowed median import time per module.
+
+    Returns:
+        List[str]: One message per violation.
+    """
+    violations = []
+    for result in results:
+        if result["median_ms"] > budget_ms:
+            violations.append(f"{result['module']} takes {result['median_ms']}ms to import (budget {budget_ms}ms)")
+        for flag in ("config_loaded", "connector_created", "engine_created", "token_provider_created"):
+            if result[flag]:
+                violations.append(f"importing {result['module']} has a side effect: {flag}")
+    return violations
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure module import times against a startup budget.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to import.")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Allowed median import time per module.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Fresh interpreters per module.")
+    parser.add_argument("--output", help="Where to write the JSON results.")
+    args = parser.parse_args(argv)
+
+    results = [measure_import(module, args.repeat) for module in args.modules]
+    for result in results:
+        print(f"{result['module']:<28} median {result['median_ms']:>8.1f}ms  max {result['max_ms']:>8.1f}ms")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"budget_ms": args.budget_ms, "results": results}, file, indent=2)
+
+    violations = check_budget(results, args.budget_ms)
+    for violation in violations:
+        print(f"FAIL: {violation}")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+from src.bench.backends import install_local_backends
+from src.batch.ingest import find_most_recent_folder
+from src.utils.gcp import upload_directory_to_gcs
+from src.batch.create import process_csv_in_chunks
+from src.run.query_pipeline import download_pdfs_from_csv
+from src.run.query_pipeline import run_bulk_queries
+from src.db.match import find_entity_urls_by_keys
+from src.batch.ingest import write_latest_pointer
+from src.run.index_pipeline import process_blobs
+from src.db.match import clear_lookup_cache
+from src.bench.backends import LatencyModel
+from src.utils.metrics import get_metrics
+from src.db.create import migrate_table
+from src.db.create import create_table
+from src.config.setup import config
+from src.config.logging import logger
+from datetime import datetime
+from datetime import timezone
+from typing import Callable
+from typing import Optional
+from typing import List
+from typing import Dict
+from typing import Any
+import subprocess
+import platform
+import argparse
+import tempfile
+import logging
+import random
+import shutil
+import json
+import time
+import csv
+import os
+
+
+# Entity counts benchmarked by default
+DEFAULT_SCALES = [1000, 10000, 100000]
+# Queries sent per scale; the query stage measures throughput, not coverage
+DEFAULT_QUERY_COUNT = 500
+BUCKET = "bench-bucket"
+SEARCH_TOPIC = "Graduate Handbook"
+
+
+def git_commit() -> Optional[str]:
+    """Returns the current commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def write_entities_csv(path: str, count: int) -> None:
+    """
+    Writes a synthetic entities CSV with the same columns as `data/entities.csv`.
+
+    Args:
+        path (str): The output file.
+        count (int): The number of entities.
+    """
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["entity", "url", "country"])
+        for i in range(count):
+            writer.writerow([f"Entity {i} University", f"*.entity{i}.edu/*", "United States"])
+
+
+def timed(stage: str, func: Callable[[], Any], items: int) -> Dict[str, Any]:
+    """
+    Runs one stage and records its wall time and throughput.
+
+    Args:
+        stage (str): The stage name.
+        func (Callable[[], Any]): The stage to run.
+        items (int): The number of items the stage processes.
+
+    Returns:
+        Dict[str, Any]: The stage name, seconds, items and items per second.
+    """
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    result = {
+        "stage": stage,
+        "seconds": round(elapsed, 4),
+        "items": items,
+        "items_per_sec": round(items / elapsed, 2) if elapsed > 0 else None,
+    }
+    logger.warning(f"{stage}: {items} items in {elapsed:.2f}s")
+    return result
+
+
+def run_scale(count: int, workdir: str, latency_model: LatencyModel, query_count: int) -> List[Dict[str, Any]]:
+    """
+    Runs the index pipeline, a bulk query run and a PDF download run for one entity count against local backends.
+
+    Args:
+        count (int): The number of entities.
+        workdir (str): A scratch directory for this scale.
+        latency_model (LatencyModel): Delay and failure injection for the fake Discovery Engine.
+        query_count (int): The number of entities queried, and of PDFs downloaded.
+
+    Returns:
+        List[Dict[str, Any]]: One timing record per stage.
+    """
+    backends = install_local_backends(workdir, latency_model)
+    get_metrics().reset()
+
+    csv_path = os.path.join(workdir, "entities.csv")
+    chunk_dir = os.path.join(workdir, "chunks")
+    folder = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    engine = backends["engine"]
+    stages = []
+
+    write_entities_csv(csv_path, count)
+    batches = (count + 49) // 50
+
+    stages.append(timed("split", lambda: process_csv_in_chunks(csv_path, chunk_dir), count))
+
+    def upload():
+        upload_directory_to_gcs(chunk_dir, BUCKET, folder)
+        write_latest_pointer(BUCKET, folder, sorted(os.listdir(chunk_dir)))
+    stages.append(timed("upload", upload, batches))
+
+    latest = {}
+    stages.append(timed("latest", lambda: latest.update(folder=find_most_recent_folder(BUCKET)), 1))
+
+    def ingest():
+        create_table(engine)
+        migrate_table(engine)
+        process_blobs(BUCKET, latest["folder"], engine)
+    stages.append(timed("ingest", ingest, count))
+    # Nothing changed, so this measures the delta check alone
+    stages.append(timed("reingest", lambda: process_blobs(BUCKET, latest["folder"], engine), count))
+
+    keys = [(f"Entity {i} University", "United States") for i in range(count)]
+    def lookup():
+        clear_lookup_cache()
+        find_entity_urls_by_keys(keys)
+    stages.append(timed("lookup", lookup, count))
+
+    query_keys = random.Random(0).sample(keys, min(query_count, count))
+    clear_lookup_cache()
+    stages.append(timed("query", lambda: run_bulk_queries(query_keys, SEARCH_TOPIC, 16), len(query_keys)))
+
+    pdf_server = backends["pdf"]
+    results_path = os.path.join(workdir, "results.csv")
+    pdf_dir = os.path.join(workdir, "pdfs")
+    with open(results_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["entity", "country", "pdf_url"])
+        for i, (entity, country) in enumerate(query_keys):
+            writer.writerow([entity, country, pdf_server.url(f"entity{i}/handbook")])
+    stages.append(timed("download", lambda: download_pdfs_from_csv(results_path, pdf_dir), len(query_keys)))
+    # Every PDF is stored already, so this measures conditional revalidation alone
+    stages.append(timed("redownload", lambda: download_pdfs_from_csv(results_path, pdf_dir), len(query_keys)))
+
+    server = backends["server"]
+    logger.warning(f"Fake Discovery Engine calls: {dict(server.calls)}; search calls: {backends['search'].calls}; "
+                   f"PDF server responses: {dict(pdf_server.calls)}")
+    server.stop()
+    pdf_server.stop()
+    engine.dispose()
+    return stages
+
+
+def run_benchmark(scales: List[int], latency_ms: float = 0.0, error_rate: float = 0.0,
+                  query_count: int = DEFAULT_QUERY_COUNT, keep: bool = False) -> Dict[str, Any]:
+    """
+    Runs the benchmark for every scale.
+
+    Args:
+        scales (List[int]): Entity counts to benchmark.
+        latency_ms (float): Latency added to every fake Discovery Engine call, in milliseconds.
+        error_rate (float): Fraction of fake Discovery Engine calls that fail.
+        query_count (int): Entities queried per scale.
+        keep (bool): Keep the scratch directories for inspection.
+
+    Returns:
+        Dict[str, Any]: The report, with run metadata and the stage timings per scale.
+    """
+    config.SEARCH_CACHE_ENABLED = False
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "params": {"scales": scales, "latency_ms": latency_ms, "error_rate": error_rate, "query_count": query_count},
+        "results": {},
+    }
+    for count in scales:
+        workdir = tempfile.mkdtemp(prefix=f"bench_{count}_")
+        try:
+            latency_model = LatencyModel(latency=latency_ms / 1000, error_rate=error_rate, seed=count)
+            report["results"][str(count)] = run_scale(count, workdir, latency_model, query_count)
+            report.setdefault("metrics", {})[str(count)] = get_metrics().summary()
+        finally:
+            if not keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """
+    Compares two reports stage by stage.
+
+    Args:
+        old (Dict[str, Any]): The baseline report.
+        new (Dict[str, Any]): The report to compare.
+
+    Returns:
+        List[str]: One line per stage present in both, with the speedup of `new` over `old`.
+    """
+    lines = []
+    for scale, stages in new["results"].items():
+        baseline = {stage["stage"]: stage for stage in old["results"].get(scale, [])}
+        for stage in stages:
+            before = baseline.get(stage["stage"])
+            if before is None or not stage["seconds"]:
+                continue
+            speedup = before["seconds"] / stage["seconds"]
+            lines.append(f"{scale:>7} {stage['stage']:<9} {before['seconds']:>9.3f}s -> {stage['seconds']:>9.3f}s  x{speedup:.2f}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the index and query pipelines.")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="Entity counts to benchmark.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every fake API call.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake API calls that fail.")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERY_COUNT, help="Entities queried per scale.")
+    parser.add_argument("--output", default="./data/bench/report.json", help="Where to write the JSON report.")
+    parser.add_argument("--compare", help="A previous report to compare against.")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directories.")
+    parser.add_argument("--log-level", default="WARNING", help="Log level while benchmarking.")
+    args = parser.parse_args()
+
+    logger.setLevel(getattr(logging, args.log_level.upper()))
+    report = run_benchmark(args.scales, args.latency_ms, args.error_rate, args.queries, args.keep)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            print("\n".join(compare(json.load(file), report)))
+
+
+if __name__ == "__main__":
+    main()
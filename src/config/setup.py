@@ -1,7 +1,7 @@
 from src.config.logging import logger
 from typing import Dict
 from typing import Any
-import subprocess
+import threading
 import yaml
 import os
 
@@ -17,7 +17,7 @@ class Config:
     
     def __init__(self, config_path: str = "./config/config.yml"):
         """
-        Initialize the Config class.
+        Initialize the Config class. The YAML file is only read when a setting is first accessed.
 
         Args:
         - config_path (str): Path to the YAML configuration file.
@@ -25,12 +25,52 @@ class Config:
         if self.__initialized:
             return
         self.__initialized = True
-        
-        self.__config = self._load_config(config_path)
+        self.__config_path = config_path
+        self.__loaded = False
+        self.__lock = threading.RLock()
+
+    def __getattr__(self, name: str) -> Any:
+        """
+        Loads the configuration on first access to a setting that has not been set yet.
+        """
+        if name.startswith('_'):
+            raise AttributeError(name)
+        self.load()
+        return object.__getattribute__(self, name)
+
+    def load(self) -> "Config":
+        """
+        Reads the YAML configuration and sets the Google credentials environment variable, once.
+        Settings assigned before loading (e.g. by tests or benchmarks) are kept.
+
+        Returns:
+        - Config: The loaded configuration.
+        """
+        with self.__lock:
+            if self.__loaded:
+                return self
+            overrides = {name: value for name, value in self.__dict__.items() if name.isupper()}
+            self.__config = self._load_config(self.__config_path)
+            self._apply_config()
+            self.__dict__.update(overrides)
+            self._set_google_credentials(self.CREDENTIALS_PATH)
+            self.__loaded = True
+            return self
+
+    @property
+    def loaded(self) -> bool:
+        """
+        Whether the YAML configuration has been read yet.
+        """
+        return self.__loaded
+
+    def _apply_config(self) -> None:
+        """
+        Sets every setting from the loaded YAML configuration.
+        """
         self.PROJECT_ID = self.__config['project_id']
         self.CREDENTIALS_PATH = self.__config['credentials_json']
-        self._set_google_credentials(self.CREDENTIALS_PATH)
-        self.ACCESS_TOKEN = self._set_access_token()
+        self.ACCESS_TOKEN_SOURCE = self.__config.get('access_token_source', 'gcloud')
         self.REGION = self.__config['region']
         self.INPUT_FILE_PATH = self.__config['input_file_path']
         self.LOCAL_OUTPUT_PATH = self.__config['local_output_path']
@@ -40,6 +80,32 @@ class Config:
         self.CLOUD_SQL_PASSWORD = self.__config['cloud_sql_password']
         self.CLOUD_SQL_DATABASE = self.__config['cloud_sql_database']
         self.CLOUD_SQL_TABLE = self.__config['cloud_sql_table']
+        self.DISCOVERY_ENGINE_ENDPOINT = self.__config.get('discovery_engine_endpoint', 'https://discoveryengine.googleapis.com')
+        self.HTTP_POOL_SIZE = self.__config.get('http_pool_size', 32)
+        self.HTTP_TIMEOUT = self.__config.get('http_timeout', 30)
+        self.QUERY_MAX_IN_FLIGHT = self.__config.get('query_max_in_flight', 16)
+        self.ENTITY_CACHE_SIZE = self.__config.get('entity_cache_size', 100000)
+        self.ENTITY_CACHE_TTL = self.__config.get('entity_cache_ttl', 3600)
+        self.INDEX_MAX_WORKERS = self.__config.get('index_max_workers', 8)
+        self.TARGET_SITE_MAX_CONCURRENCY = self.__config.get('target_site_max_concurrency', 4)
+        self.UPLOAD_MAX_WORKERS = self.__config.get('upload_max_workers', 16)
+        self.SPLIT_MAX_WORKERS = self.__config.get('split_max_workers', 4)
+        self.SEARCH_CACHE_ENABLED = self.__config.get('search_cache_enabled', True)
+        self.SEARCH_CACHE_PATH = self.__config.get('search_cache_path', './data/cache/search.sqlite')
+        self.SEARCH_CACHE_TTL = self.__config.get('search_cache_ttl', 86400)
+        self.SEARCH_CACHE_MAX_ENTRIES = self.__config.get('search_cache_max_entries', 100000)
+        self.DOWNLOAD_MAX_WORKERS = self.__config.get('download_max_workers', 8)
+        self.DOWNLOAD_PER_HOST = self.__config.get('download_per_host', 2)
+        self.METRICS_DIR = self.__config.get('metrics_dir', './data/metrics')
+        self.DB_DSN = self.__config.get('db_dsn') or None
+        self.DB_POOL_SIZE = self.__config.get('db_pool_size', 16)
+        self.DB_MAX_OVERFLOW = self.__config.get('db_max_overflow', 8)
+        self.DB_POOL_TIMEOUT = self.__config.get('db_pool_timeout', 30)
+        self.DB_POOL_RECYCLE = self.__config.get('db_pool_recycle', 1800)
+        self.DB_POOL_PRE_PING = self.__config.get('db_pool_pre_ping', True)
+        self.FANOUT_STORE_TIMEOUT = self.__config.get('fanout_store_timeout', 5)
+        self.FANOUT_TIMEOUT = self.__config.get('fanout_timeout', 8)
+        self.FANOUT_MAX_IN_FLIGHT = self.__config.get('fanout_max_in_flight', 256)
 
     @staticmethod
     def _load_config(config_path: str) -> Dict[str, Any]:
@@ -68,22 +134,19 @@ class Config:
         """
         os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_path
 
-    @staticmethod
-    def _set_access_token() -> str:
+    @property
+    def ACCESS_TOKEN(self) -> str:
         """
         Fetch an access token for authentication.
 
+        The token is served from the shared, auto-refreshing token provider, so
+        reading this attribute does not start a `gcloud` process on every call.
+
         Returns:
-        - str: The fetched access token.
+        - str: The current access token.
         """
-        logger.info("Fetching access token...")
-        cmd = ["gcloud", "auth", "print-access-token"]
-        try:
-            token = subprocess.check_output(cmd).decode('utf-8').strip()
-            logger.info("Access token obtained successfully.")
-            return token
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Failed to fetch access token. Error: {e}")
+        from src.utils.access import fetch_access_token
+        return fetch_access_token()
 
 
 config = Config()
\ No newline at end of file
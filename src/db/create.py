@@ -1,13 +1,16 @@
-
-from src.utils.db import create_engine_with_connection_pool
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.engine.base import Engine 
 from src.config.logging import logger
+from src.utils.metrics import get_metrics
 from src.config.setup import config
+from sqlalchemy import inspect
 from sqlalchemy import text
+from typing import List
+import hashlib
 
 
-engine = create_engine_with_connection_pool()
+# Columns whose values decide whether an entry must be re-indexed
+HASHED_COLUMNS = ("entity", "url", "country", "batch_id")
 
 
 def create_table(engine: Engine):
@@ -17,28 +20,77 @@ def create_table(engine: Engine):
     Args:
         engine: A SQLAlchemy engine object.
     """
-    create_table_statement = text(f"""
-        CREATE TABLE IF NOT EXISTS {config.CLOUD_SQL_TABLE} (
-            entity VARCHAR(255) NOT NULL,
-            url VARCHAR(255) NOT NULL,
-            country VARCHAR(255) NOT NULL,
-            batch_id VARCHAR(255) NOT NULL,
-            created_at TIMESTAMP NOT NULL,
-            cloud_storage_uri VARCHAR(255),
-            PRIMARY KEY (entity, country),
-            INDEX idx_entity (entity)
-        );
-    """)
+    definitions = [
+        "entity VARCHAR(255) NOT NULL",
+        "url VARCHAR(255) NOT NULL",
+        "country VARCHAR(255) NOT NULL",
+        "batch_id VARCHAR(255) NOT NULL",
+        "created_at TIMESTAMP NOT NULL",
+        "cloud_storage_uri VARCHAR(255)",
+        "content_hash CHAR(64)",
+        "PRIMARY KEY (entity, country)"
+    ]
+    indexes = {"idx_entity": "entity", "idx_batch_id": "batch_id"}
+    if engine.dialect.name == "mysql":
+        definitions += [f"INDEX {name} ({column})" for name, column in indexes.items()]
+        index_statements = []
+    else:
+        # Inline INDEX clauses are MySQL-only
+        index_statements = [text(f"CREATE INDEX IF NOT EXISTS {name} ON {config.CLOUD_SQL_TABLE} ({column})")
+                            for name, column in indexes.items()]
+    create_table_statement = text(
+        f"CREATE TABLE IF NOT EXISTS {config.CLOUD_SQL_TABLE} ({', '.join(definitions)})"
+    )
 
     try:
         with engine.begin() as connection:  # Use `begin()` for automatic commit/rollback
             connection.execute(create_table_statement)
+            for statement in index_statements:
+                connection.execute(statement)
             logger.info("Table 'entity_urls' created successfully.")
     except SQLAlchemyError as e:
         logger.error(f"Failed to create table 'entity_urls': {e}")
         raise
 
 
+def migrate_table(engine: Engine):
+    """
+    Adds the 'content_hash' column and the 'batch_id' index to an 'entity_urls' table
+    created before they existed.
+
+    Args:
+        engine: A SQLAlchemy engine object.
+    """
+    try:
+        inspector = inspect(engine)
+        columns = {column["name"] for column in inspector.get_columns(config.CLOUD_SQL_TABLE)}
+        indexes = {index["name"] for index in inspector.get_indexes(config.CLOUD_SQL_TABLE)}
+        with engine.begin() as connection:
+            if "content_hash" not in columns:
+                connection.execute(text(f"ALTER TABLE {config.CLOUD_SQL_TABLE} ADD COLUMN content_hash CHAR(64)"))
+                logger.info("Column 'content_hash' added to table 'entity_urls'.")
+            if "idx_batch_id" not in indexes:
+                connection.execute(text(f"CREATE INDEX idx_batch_id ON {config.CLOUD_SQL_TABLE} (batch_id)"))
+                logger.info("Index 'idx_batch_id' added to table 'entity_urls'.")
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to migrate table 'entity_urls': {e}")
+        raise
+
+
+def compute_content_hash(entity_url_data: dict) -> str:
+    """
+    Hashes the fields of an entry that determine how it is indexed.
+
+    Args:
+        entity_url_data: A dictionary containing the column data for an entry.
+
+    Returns:
+        The hex SHA-256 of the entity, url, country and batch_id.
+    """
+    fields = [str(entity_url_data.get(key, '')) for key in HASHED_COLUMNS]
+    return hashlib.sha256("\x1f".join(fields).encode('utf-8')).hexdigest()
+
+
 def insert_entity_url(engine: Engine, entity_url_data: dict):
     """
     Inserts a new entry into the 'entity_urls' table.
@@ -63,4 +115,93 @@ def insert_entity_url(engine: Engine, entity_url_data: dict):
             logger.info(f"Info for {entity} inserted successfully.")
     except SQLAlchemyError as e:
         logger.error(f"Failed to insert entity_url entry: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+def upsert_entity_urls(engine: Engine, entity_url_rows: List[dict], indexed: bool = True) -> List[dict]:
+    """
+    Inserts or updates many entries in the 'entity_urls' table in a single transaction.
+
+    Rows are written with one executemany `INSERT ... ON DUPLICATE KEY UPDATE` (`ON CONFLICT ... DO UPDATE`
+    on other dialects such as SQLite), so re-running ingestion for the same (entity, country)
+    updates the existing row instead of failing.
+    If the batch is rejected, rows are retried one by one inside savepoints so that a single
+    bad row does not discard the rest.
+
+    Args:
+        engine: A SQLAlchemy engine object.
+        entity_url_rows: Dictionaries containing the column data for each entry.
+        indexed: Whether the rows are already indexed. If False their content hash is stored as NULL,
+            so they count as changed until `mark_entity_urls_indexed` stores it.
+
+    Returns:
+        The rows that were written successfully, with their content hash.
+    """
+    if not entity_url_rows:
+        return []
+    entity_url_rows = [{**row, "content_hash": row.get("content_hash") or compute_content_hash(row)} for row in entity_url_rows]
+    parameters = entity_url_rows if indexed else [{**row, "content_hash": None} for row in entity_url_rows]
+
+    updated_columns = ("url", "batch_id", "created_at", "cloud_storage_uri", "content_hash")
+    if engine.dialect.name == "mysql":
+        update_clause = "ON DUPLICATE KEY UPDATE " + ", ".join(f"{c} = VALUES({c})" for c in updated_columns)
+    else:
+        update_clause = "ON CONFLICT (entity, country) DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in updated_columns)
+    upsert_stmt = text(
+        f"INSERT INTO {config.CLOUD_SQL_TABLE} (entity, url, country, batch_id, "
+        "created_at, cloud_storage_uri, content_hash) "
+        "VALUES (:entity, :url, :country, :batch_id, "
+        f":created_at, :cloud_storage_uri, :content_hash) {update_clause}"
+    )
+
+    metrics = get_metrics()
+    try:
+        with metrics.track("db.upsert"), engine.begin() as connection:
+            connection.execute(upsert_stmt, parameters)
+        metrics.inc("rows", "db.upsert", len(entity_url_rows))
+        logger.info(f"Upserted {len(entity_url_rows)} entity_url entries.")
+        return list(entity_url_rows)
+    except SQLAlchemyError as e:
+        logger.error(f"Batch upsert of {len(entity_url_rows)} entity_url entries failed, retrying row by row: {e}")
+        metrics.record_retry("db.upsert")
+
+    succeeded = []
+    with metrics.track("db.upsert_row_by_row"), engine.begin() as connection:
+        for row, row_parameters in zip(entity_url_rows, parameters):
+            try:
+                with connection.begin_nested():
+                    connection.execute(upsert_stmt, row_parameters)
+                succeeded.append(row)
+            except SQLAlchemyError as e:
+                metrics.record_error("db.upsert_row_by_row")
+                logger.error(f"Failed to upsert entity_url entry for {row.get('entity')}: {e}")
+    metrics.inc("rows", "db.upsert", len(succeeded))
+    logger.info(f"Upserted {len(succeeded)} of {len(entity_url_rows)} entity_url entries.")
+    return succeeded
+
+
+def mark_entity_urls_indexed(engine: Engine, entity_url_rows: List[dict]):
+    """
+    Stores the content hash of entries whose target sites were indexed, so the next run
+    finds them unchanged and skips them.
+
+    Args:
+        engine: A SQLAlchemy engine object.
+        entity_url_rows: The indexed entries, as returned by `upsert_entity_urls`.
+    """
+    if not entity_url_rows:
+        return
+    update_stmt = text(
+        f"UPDATE {config.CLOUD_SQL_TABLE} SET content_hash = :content_hash "
+        "WHERE entity = :entity AND country = :country AND batch_id = :batch_id"
+    )
+
+    try:
+        with get_metrics().track("db.mark_indexed"), engine.begin() as connection:
+            connection.execute(update_stmt, [
+                {key: row[key] for key in ("entity", "country", "batch_id", "content_hash")} for row in entity_url_rows
+            ])
+        logger.info(f"Marked {len(entity_url_rows)} entity_url entries as indexed.")
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to mark entity_url entries as indexed: {e}")
+        raise
@@ -1,4 +1,4 @@
-from src.utils.db import create_engine_with_connection_pool
+from src.utils.db import get_engine
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.engine.base import Engine
 from src.config.logging import logger
@@ -6,8 +6,6 @@ from src.config.setup import config
 from sqlalchemy import text
 
 
-engine = create_engine_with_connection_pool()
-
 
 def delete_table() -> None:
     """
@@ -21,7 +19,7 @@ def delete_table() -> None:
     
     try:
         # Use the engine to execute the SQL command
-        with engine.connect() as connection:
+        with get_engine().connect() as connection:
             connection.execute(sql_command)
             logger.info(f"Table {config.CLOUD_SQL_TABLE} deleted successfully.")
     except SQLAlchemyError as e:
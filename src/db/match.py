@@ -1,12 +1,59 @@
-from src.utils.db import create_engine_with_connection_pool
+from src.utils.db import get_engine
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.engine.base import Engine 
 from src.config.logging import logger
+from src.utils.metrics import get_metrics
 from src.config.setup import config
+from cachetools import TTLCache
 from sqlalchemy import text
+from typing import Optional
+from typing import Tuple
+from typing import List
+from typing import Dict
+import threading
+import asyncio
 
 
-engine = create_engine_with_connection_pool()
+# Maximum number of (entity, country) pairs resolved per SELECT
+LOOKUP_BATCH_SIZE = 500
+
+# In-process cache of (entity, country) -> row, shared by all lookups and created on first use
+_lookup_cache = None
+_lookup_cache_lock = threading.Lock()
+
+COLUMNS = ("entity", "url", "country", "batch_id", "created_at", "cloud_storage_uri")
+
+
+def _row_to_dict(result) -> dict:
+    """
+    Maps a selected row to a dictionary keyed by column name.
+    """
+    return dict(zip(COLUMNS, result))
+
+
+def _get_lookup_cache_locked() -> TTLCache:
+    global _lookup_cache
+    if _lookup_cache is None:
+        _lookup_cache = TTLCache(maxsize=config.ENTITY_CACHE_SIZE, ttl=config.ENTITY_CACHE_TTL)
+    return _lookup_cache
+
+
+def _get_cached(key: Tuple[str, str]) -> Optional[dict]:
+    with _lookup_cache_lock:
+        return _get_lookup_cache_locked().get(key)
+
+
+def _set_cached(key: Tuple[str, str], row: dict) -> None:
+    with _lookup_cache_lock:
+        _get_lookup_cache_locked()[key] = row
+
+
+def clear_lookup_cache() -> None:
+    """
+    Drops all cached lookups, e.g. after the table has been re-populated.
+    """
+    with _lookup_cache_lock:
+        if _lookup_cache is not None:
+            _lookup_cache.clear()
 
 
 def find_entity_url_by_key(entity: str, country: str) -> dict:
@@ -20,29 +67,169 @@ def find_entity_url_by_key(entity: str, country: str) -> dict:
     Returns:
         A dictionary representing the found row, or None if no matching row is found.
     """
+    metrics = get_metrics()
+    cached = _get_cached((entity, country))
+    if cached is not None:
+        metrics.inc("cache_hits", "db.lookup")
+        return cached
+    metrics.inc("cache_misses", "db.lookup")
+
     select_stmt = text(
         f"SELECT entity, url, country, batch_id, created_at, cloud_storage_uri FROM {config.CLOUD_SQL_TABLE} "
         "WHERE entity = :entity AND country = :country"
     )
 
     try:
-        with engine.connect() as connection:
+        with metrics.track("db.lookup"), get_engine().connect() as connection:
             result = connection.execute(select_stmt, {"entity": entity, "country": country}).fetchone()
             if result:
                 logger.info(f"Matching row for {entity} in {country} found.")
                 # Map the result to a dictionary using specified keys
-                result_dict = {
-                    "entity": result[0],
-                    "url": result[1],
-                    "country": result[2],
-                    "batch_id": result[3],
-                    "created_at": result[4],
-                    "cloud_storage_uri": result[5]
-                }
+                result_dict = _row_to_dict(result)
+                _set_cached((entity, country), result_dict)
                 return result_dict
             else:
                 logger.info(f"No matching row for {entity} in {country}.")
                 return None
     except SQLAlchemyError as e:
         logger.error(f"Failed to find entity_url entry: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+def find_entity_urls_by_keys(keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], dict]:
+    """
+    Resolves many (entity, country) pairs at once. Cached pairs are served from memory
+    and the rest are fetched with one SELECT per `LOOKUP_BATCH_SIZE` pairs.
+
+    Returned rows are mapped back to the pair they were looked up by when the stored entity and
+    country are equal to it. The database's collation may also match pairs that differ from the
+    stored row, e.g. in case or accents, so when a SELECT returns rows that no pair equals, its
+    unmapped pairs are resolved one at a time with `find_entity_url_by_key`, letting the database
+    decide which row each one matches. Pairs that are not two strings, e.g. NaN from an empty CSV
+    cell, are skipped.
+
+    Args:
+        keys: The (entity, country) pairs to look up.
+
+    Returns:
+        A dictionary mapping each found (entity, country) pair, as given, to its row. Pairs without a row are omitted.
+    """
+    found = {}
+    missing = []
+    for key in dict.fromkeys(keys):
+        if not all(isinstance(part, str) for part in key):
+            logger.warning(f"Skipping lookup of invalid entity key {key!r}.")
+            continue
+        cached = _get_cached(key)
+        if cached is not None:
+            found[key] = cached
+        else:
+            missing.append(key)
+
+    from_cache = len(found)
+    metrics = get_metrics()
+    metrics.inc("cache_hits", "db.lookup_batch", from_cache)
+    metrics.inc("cache_misses", "db.lookup_batch", len(missing))
+    unmapped = []
+    if missing:
+        try:
+            with get_engine().connect() as connection:
+                for start in range(0, len(missing), LOOKUP_BATCH_SIZE):
+                    batch = missing[start:start + LOOKUP_BATCH_SIZE]
+                    placeholders = ", ".join(f"(:entity_{i}, :country_{i})" for i in range(len(batch)))
+                    params = {}
+                    for i, (entity, country) in enumerate(batch):
+                        params[f"entity_{i}"] = entity
+                        params[f"country_{i}"] = country
+                    select_stmt = text(
+                        f"SELECT {', '.join(COLUMNS)} FROM {config.CLOUD_SQL_TABLE} "
+                        f"WHERE (entity, country) IN ({placeholders})"
+                    )
+                    with metrics.track("db.lookup_batch"):
+                        rows = [_row_to_dict(result) for result in connection.execute(select_stmt, params).fetchall()]
+                    exact = {(row["entity"], row["country"]): row for row in rows}
+                    batch_unmapped = []
+                    for key in batch:
+                        row = exact.get(key)
+                        if row is not None:
+                            _set_cached(key, row)
+                            found[key] = row
+                        else:
+                            batch_unmapped.append(key)
+                    if len(rows) > len(batch) - len(batch_unmapped):
+                        unmapped.extend(batch_unmapped)
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to find entity_url entries: {e}")
+            raise
+
+    for key in unmapped:
+        row = find_entity_url_by_key(*key)
+        if row is not None:
+            found[key] = row
+
+    logger.info(f"Resolved {len(found)} of {len(set(keys))} entities ({from_cache} from cache).")
+    return found
+
+
+async def find_entity_url_by_key_async(entity: str, country: str) -> dict:
+    """
+    Async counterpart of `find_entity_url_by_key`. Cache hits return immediately; misses
+    run the blocking query on a worker thread so the event loop is not stalled.
+    """
+    cached = _get_cached((entity, country))
+    if cached is not None:
+        get_metrics().inc("cache_hits", "db.lookup")
+        return cached
+    return await asyncio.to_thread(find_entity_url_by_key, entity, country)
+
+
+async def find_entity_urls_by_keys_async(keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], dict]:
+    """
+    Async counterpart of `find_entity_urls_by_keys`, running the bulk lookup on a worker thread.
+    """
+    return await asyncio.to_thread(find_entity_urls_by_keys, keys)
+
+
+def find_content_hashes_by_batch(batch_id: str) -> Dict[Tuple[str, str], Tuple[Optional[str], str]]:
+    """
+    Finds the stored content hash and url of every row in a batch.
+
+    Args:
+        batch_id: The batch to look up.
+
+    Returns:
+        A dictionary mapping each (entity, country) pair in the batch to its (content_hash, url).
+    """
+    select_stmt = text(
+        f"SELECT entity, country, content_hash, url FROM {config.CLOUD_SQL_TABLE} "
+        "WHERE batch_id = :batch_id"
+    )
+
+    try:
+        with get_metrics().track("db.content_hashes"), get_engine().connect() as connection:
+            results = connection.execute(select_stmt, {"batch_id": batch_id})
+            return {(entity, country): (content_hash, url) for entity, country, content_hash, url in results}
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to find content hashes for batch {batch_id}: {e}")
+        raise
+
+
+def find_batch_ids(country: Optional[str] = None) -> List[str]:
+    """
+    Finds the batch IDs, i.e. data stores, holding entities, optionally only those of one country.
+
+    Args:
+        country: Only return batches with at least one entity in this country.
+
+    Returns:
+        The distinct batch IDs, sorted.
+    """
+    where = "WHERE country = :country " if country is not None else ""
+    select_stmt = text(f"SELECT DISTINCT batch_id FROM {config.CLOUD_SQL_TABLE} {where}ORDER BY batch_id")
+
+    try:
+        with get_metrics().track("db.batch_ids"), get_engine().connect() as connection:
+            return [batch_id for (batch_id,) in connection.execute(select_stmt, {"country": country})]
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to find batch ids: {e}")
+        raise
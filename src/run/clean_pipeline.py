@@ -3,6 +3,8 @@ from src.search.delete import list_data_stores
 from src.search.delete import delete_app
 from src.search.delete import list_apps
 from src.db.delete import delete_table
+from src.utils.metrics import write_metrics_report
+from src.utils.metrics import get_metrics
 from src.utils.gcp import flush_bucket
 from src.config.setup import config
 from src.config.setup import logger
@@ -59,16 +61,24 @@ def main():
     Returns:
     - None
     """
-    # Clean Cloud SQL table 
-    delete_table()
+    metrics = get_metrics()
+    try:
+        # Clean Cloud SQL table 
+        with metrics.track("stage.delete_table"):
+            delete_table()
 
-    # Clean search apps and data stores with a specific prefix
-    prefix = "site_search"
-    delete_search_apps(prefix)
-    delete_data_stores(prefix)
+        # Clean search apps and data stores with a specific prefix
+        prefix = "site_search"
+        with metrics.track("stage.delete_search_apps"):
+            delete_search_apps(prefix)
+        with metrics.track("stage.delete_data_stores"):
+            delete_data_stores(prefix)
 
-    # Clean GCS bucket 
-    flush_bucket(config.BUCKET)
+        # Clean GCS bucket 
+        with metrics.track("stage.flush_bucket"):
+            flush_bucket(config.BUCKET)
+    finally:
+        write_metrics_report("clean")
     
 
 if __name__ == "__main__":
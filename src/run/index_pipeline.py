@@ -1,18 +1,25 @@
-from src.db.create import create_engine_with_connection_pool
-from src.batch.create import process_dataframe_chunks
+from src.batch.create import process_csv_in_chunks
 from src.batch.ingest import find_most_recent_folder
+from src.batch.ingest import write_latest_pointer
 from src.batch.ingest import list_blobs_with_prefix
 from src.batch.ingest import parse_blob_contents
-from src.search.index import create_request_body
-from src.search.index import post_target_sites
+from src.search.index import submit_target_sites
 from src.search.index import create_search_app
 from src.search.index import create_data_store
-from src.batch.create import load_dataframe
-from src.db.create import insert_entity_url
+from src.db.match import find_content_hashes_by_batch
+from src.db.create import mark_entity_urls_indexed
+from src.db.create import compute_content_hash
+from src.db.create import upsert_entity_urls
+from src.db.create import migrate_table
 from sqlalchemy.exc import SQLAlchemyError
-from src.search.index import chunk_data
-from src.utils.gcp import upload_to_gcs
+from src.utils.gcp import upload_directory_to_gcs
+from src.utils.metrics import write_metrics_report
+from src.utils.metrics import get_metrics
+from src.utils.gcp import FAILED
 from src.db.create import create_table
+from src.utils.db import get_engine
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 from src.config.logging import logger 
 from sqlalchemy.engine import Engine
 from src.config.setup import config
@@ -20,9 +27,15 @@ from datetime import datetime
 from typing import Optional
 from typing import Tuple
 from typing import List 
+from typing import Dict
 import os 
 
 
+BATCH_COMPLETED = "completed"
+BATCH_FAILED = "failed"
+BATCH_SKIPPED = "skipped"
+
+
 def load_and_process_input_data(input_file_path: str, local_output_path: str) -> None:
     """
     Load input data from a CSV file, process it into chunks, and write those chunks to a local directory.
@@ -35,8 +48,7 @@ def load_and_process_input_data(input_file_path: str, local_output_path: str) ->
     None
     """
     try:
-        df = load_dataframe(input_file_path)
-        process_dataframe_chunks(df, local_output_path)
+        process_csv_in_chunks(input_file_path, local_output_path)
         logger.info("Dataframe loaded and processed successfully.")
     except Exception as e:
         logger.error(f"An error occurred during processing: {e}")
@@ -45,6 +57,7 @@ def load_and_process_input_data(input_file_path: str, local_output_path: str) ->
 def upload_chunks_to_gcs(local_output_path: str, bucket_name: str) -> None:
     """
     Uploads processed data chunks from a local directory to Google Cloud Storage (GCS).
+    Chunks that are unchanged since the previous run are copied server-side instead of re-uploaded.
 
     Parameters:
     - local_output_path: The directory path where chunked dataframes are stored.
@@ -55,11 +68,13 @@ def upload_chunks_to_gcs(local_output_path: str, bucket_name: str) -> None:
     """
     timestamp_folder = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
     try:
-        for filename in os.listdir(local_output_path):
-            source_file_path = os.path.join(local_output_path, filename)
-            destination_blob_name = f"{timestamp_folder}/{filename}"
-            upload_to_gcs(bucket_name, source_file_path, destination_blob_name)
-        logger.info("Files uploaded to GCS successfully.")
+        previous_folder = find_most_recent_folder(bucket_name)
+        counts = upload_directory_to_gcs(local_output_path, bucket_name, timestamp_folder, reference_prefix=previous_folder)
+        if counts[FAILED]:
+            logger.error(f"{counts[FAILED]} files failed to upload to GCS.")
+        else:
+            write_latest_pointer(bucket_name, timestamp_folder, sorted(os.listdir(local_output_path)))
+            logger.info("Files uploaded to GCS successfully.")
     except Exception as e:
         logger.error(f"Failed to upload files to GCS: {e}")
 
@@ -76,8 +91,9 @@ def process_most_recent_data(bucket_name: str) -> None:
     None
     """
     try:
-        engine = create_engine_with_connection_pool()
+        engine = get_engine()
         create_table(engine)
+        migrate_table(engine)
         most_recent_folder = find_most_recent_folder(bucket_name)
         if not most_recent_folder:
             logger.info("No recent folder found.")
@@ -89,27 +105,44 @@ def process_most_recent_data(bucket_name: str) -> None:
         logger.error(f"Error processing the most recent data: {e}", exc_info=True)
 
 
-def process_blobs(bucket_name: str, folder: str, engine: Engine) -> None:
+def process_blobs(bucket_name: str, folder: str, engine: Engine, max_workers: Optional[int] = None) -> Dict[str, List[str]]:
     """
-    Iterates over and processes each blob within a specified folder of the bucket.
+    Processes each blob within a specified folder of the bucket, indexing several batches at once
+    on a worker pool. Errors are handled per batch, and a summary is logged at the end.
 
     Parameters:
     - bucket_name (str): The GCS bucket name.
     - folder (str): The folder name in the bucket.
     - engine (Engine): Database engine instance for operations.
+    - max_workers (Optional[int]): Number of batches indexed concurrently. Defaults to `index_max_workers` from the config.
 
     Returns:
-    None
+    Dict[str, List[str]]: Blob names grouped by status ('completed', 'failed' or 'skipped').
     """
-    blobs = list_blobs_with_prefix(bucket_name, folder)
-    for blob in blobs:
-        process_blob(blob, bucket_name, engine)
-        # break  # Uncomment this line for testing
-
-
-def process_blob(blob, bucket_name: str, engine: Engine) -> None:
+    max_workers = max_workers or config.INDEX_MAX_WORKERS
+    blobs = list(list_blobs_with_prefix(bucket_name, folder))
+    summary = {BATCH_COMPLETED: [], BATCH_FAILED: [], BATCH_SKIPPED: []}
+
+    metrics = get_metrics()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(process_blob, blob, bucket_name, engine): blob.name for blob in blobs}
+        for future in as_completed(futures):
+            status = future.result()
+            metrics.inc(status, "index.batch")
+            summary[status].append(futures[future])
+
+    logger.info(f"Indexing summary for {folder}: {len(summary[BATCH_COMPLETED])} completed, "
+                f"{len(summary[BATCH_FAILED])} failed, {len(summary[BATCH_SKIPPED])} skipped.")
+    for name in sorted(summary[BATCH_FAILED]):
+        logger.error(f"Batch failed: {name}")
+    return summary
+
+
+def process_blob(blob, bucket_name: str, engine: Engine) -> str:
     """
     Parses a single blob's contents for processing, including database insertion and further data processing tasks.
+    Batches whose entities are unchanged since the last run are skipped. Rows are marked as indexed only
+    once their target sites were accepted, so a batch that failed is indexed again on the next run.
 
     Parameters:
     - blob: Blob object to be processed.
@@ -117,83 +150,133 @@ def process_blob(blob, bucket_name: str, engine: Engine) -> None:
     - engine (Engine): Database engine instance.
 
     Returns:
-    None
+    str: The batch status, one of 'completed', 'failed' or 'skipped'. A batch with some failed target sites counts as failed.
     """
     try:
-        site_urls, batch_id = parse_and_store_blob_contents(blob, bucket_name, engine)
-        if batch_id:
-            initiate_data_indexing_and_search(batch_id, site_urls)
+        with get_metrics().track("index.parse_and_store"):
+            rows, batch_id, create_resources = parse_and_store_blob_contents(blob, bucket_name, engine)
+        if not batch_id:
+            logger.info(f"No rows found in blob {blob.name}, skipping.")
+            return BATCH_SKIPPED
+        if not rows:
+            logger.info(f"No new target sites in batch {batch_id}, skipping indexing.")
+            return BATCH_SKIPPED
+
+        site_urls = list(dict.fromkeys(row['url'] for row in rows))
+        indexed_urls = set(initiate_data_indexing_and_search(batch_id, site_urls, create_resources=create_resources))
+        mark_entity_urls_indexed(engine, [row for row in rows if row['url'] in indexed_urls])
+        if len(indexed_urls) == len(site_urls):
+            return BATCH_COMPLETED
+        return BATCH_FAILED
     except Exception as e:
         logger.error(f"Error processing blob {blob.name}: {e}", exc_info=True)
+        return BATCH_FAILED
 
 
-def parse_and_store_blob_contents(blob, bucket_name: str, engine: Engine) -> Tuple[List[str], Optional[str]]:
+def parse_and_store_blob_contents(blob, bucket_name: str, engine: Engine) -> Tuple[List[dict], Optional[str], bool]:
     """
     Parses blob's contents and stores relevant data in the database.
 
+    Each row is hashed and compared with the hash stored for its batch, so only new or
+    changed entities are written. The hash is stored only for rows whose URL is already a
+    target site of the batch; the others are stored without one until they are indexed,
+    so rows whose indexing failed count as changed on the next run.
+
     Parameters:
     - blob: Blob object to parse.
     - bucket_name (str): GCS bucket name.
     - engine (Engine): Database engine instance.
 
     Returns:
-    Tuple[List[str], Optional[str]]: A list of URLs and a batch ID.
+    Tuple[List[dict], Optional[str], bool]: The stored rows whose URLs still have to be indexed as target sites,
+    the batch ID, and whether none of the batch is indexed yet, so it still needs its data store and search app.
+
+    Raises:
+    RuntimeError: If none of the changed rows could be stored.
     """
-    site_urls = []
+    entries = []
     batch_id = None
     contents = parse_blob_contents(blob, bucket_name) 
+    created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     for content in contents:
-        entity = content.get('entity')
-        url = content.get('url')
-        country = content.get('country')
         batch_id = content.get('batch_id', batch_id)  # Use existing batch_id if present
-        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cloud_storage_uri = content.get('cloud_storage_uri')
-
         entry = {
-            "entity": entity,
-            "url": url,
-            "country": country,
+            "entity": content.get('entity'),
+            "url": content.get('url'),
+            "country": content.get('country'),
             "batch_id": batch_id,
             "created_at": created_at,
-            "cloud_storage_uri": cloud_storage_uri
+            "cloud_storage_uri": content.get('cloud_storage_uri')
         }
-        try:
-            insert_entity_url(engine, entry)
-            site_urls.append(url)
-        except SQLAlchemyError as e:
-            logger.error(f"Database insertion failed for {url}: {e}", exc_info=True)
-    return site_urls, batch_id
+        entry["content_hash"] = compute_content_hash(entry)
+        entries.append(entry)
 
+    if batch_id is None:
+        return [], None, False
 
-def initiate_data_indexing_and_search(batch_id: str, site_urls: List[str]) -> None:
+    existing = find_content_hashes_by_batch(batch_id)
+    # Rows not indexed yet have no stored hash and always count as changed
+    changed = [entry for entry in entries
+               if existing.get((entry['entity'], entry['country']), (None, None))[0] != entry['content_hash']]
+    logger.info(f"Batch {batch_id}: {len(changed)} of {len(entries)} rows new, changed or not yet indexed.")
+    if not changed:
+        return [], batch_id, False
+
+    indexed_urls = {url for content_hash, url in existing.values() if content_hash is not None}
+    try:
+        stored = upsert_entity_urls(engine, [entry for entry in changed if entry['url'] in indexed_urls])
+        pending = upsert_entity_urls(engine, [entry for entry in changed if entry['url'] not in indexed_urls], indexed=False)
+    except SQLAlchemyError as e:
+        logger.error(f"Database upsert failed for blob {blob.name}: {e}", exc_info=True)
+        stored, pending = [], []
+    if not stored and not pending:
+        raise RuntimeError(f"No rows of blob {blob.name} were stored.")
+
+    return pending, batch_id, not indexed_urls
+
+
+def initiate_data_indexing_and_search(batch_id: str, site_urls: List[str], create_resources: bool = True) -> List[str]:
     """
     Initiates indexing and search-related processing for a batch of site URLs.
 
     Parameters:
     - batch_id (str): The batch ID.
     - site_urls (List[str]): List of site URLs.
+    - create_resources (bool): Whether to create the batch's data store and search app. Set to False
+      to only add target sites to an existing data store.
 
     Returns:
-    None
+    List[str]: The site URLs accepted as target sites. Empty if none were, or if the data store or
+    search app could not be created.
     """
     try:
-        data_store_response = create_data_store(batch_id)
-        logger.info(f"Data store created with response: {data_store_response}")
-
-        data = create_request_body(site_urls, batch_id)
-        chunks = chunk_data(data['requests'], 20)
-        for chunk in chunks:
-            response = post_target_sites({'requests': chunk}, batch_id)
-            if response:
-                logger.info(f"Successfully posted target sites for batch {batch_id}")
-            else:
-                logger.error(f"Failed to post target sites for batch {batch_id}")
-
+        if create_resources:
+            data_store_response = create_data_store(batch_id)
+            # 409: the data store was created by an earlier run whose indexing did not complete
+            if not data_store_response.ok and data_store_response.status_code != 409:
+                logger.error(f"Failed to create data store for batch {batch_id}: HTTP {data_store_response.status_code}")
+                return []
+            logger.info(f"Data store created with response: {data_store_response}")
+
+        target_site_results = submit_target_sites(site_urls, batch_id)
+        indexed_sites = [uri for uri, error in target_site_results.items() if error is None]
+        failed_sites = [uri for uri, error in target_site_results.items() if error is not None]
+        if not indexed_sites:
+            logger.error(f"Failed to post target sites for batch {batch_id}")
+            return []
+        if failed_sites:
+            logger.error(f"Failed to post {len(failed_sites)} target sites for batch {batch_id}: {failed_sites}")
+        else:
+            logger.info(f"Successfully posted target sites for batch {batch_id}")
+
+        if not create_resources:
+            return indexed_sites
         search_app_response = create_search_app(batch_id)
         logger.info(f"Search app created with response: {search_app_response}")
+        return indexed_sites if search_app_response is not None else []
     except Exception as e:
         logger.error(f"Error in data indexing and search initiation for batch {batch_id}: {e}", exc_info=True)
+        return []
 
 
 def chunk_data(data, chunk_size: int) -> List[List[dict]]:
@@ -208,9 +291,16 @@ def main():
     Returns:
     None
     """
-    load_and_process_input_data(config.INPUT_FILE_PATH, config.LOCAL_OUTPUT_PATH)
-    upload_chunks_to_gcs(config.LOCAL_OUTPUT_PATH, config.BUCKET)
-    process_most_recent_data(config.BUCKET)
+    metrics = get_metrics()
+    try:
+        with metrics.track("stage.split"):
+            load_and_process_input_data(config.INPUT_FILE_PATH, config.LOCAL_OUTPUT_PATH)
+        with metrics.track("stage.upload"):
+            upload_chunks_to_gcs(config.LOCAL_OUTPUT_PATH, config.BUCKET)
+        with metrics.track("stage.ingest"):
+            process_most_recent_data(config.BUCKET)
+    finally:
+        write_metrics_report("index")
 
 
 if __name__ == '__main__':
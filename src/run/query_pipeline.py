@@ -1,21 +1,32 @@
+from src.search.site_search import search_and_extract_async
+from src.search.fanout import fan_out_search_async
+from src.search.site_search import search_data_store_async
+from src.db.match import find_entity_urls_by_keys_async
 from src.search.site_search import extract_relevant_data
-from src.search.site_search import search_data_store
-from src.db.match import find_entity_url_by_key
-from requests.exceptions import ConnectionError
-from requests.exceptions import HTTPError
+from src.search.site_search import warm_up_search_client
+from src.db.match import find_entity_url_by_key_async
+from src.search.cache import get_search_cache
+from src.db.match import find_batch_ids
+from src.utils.download import PdfDownloader
+from src.utils.download import FAILED
+from src.utils.metrics import write_metrics_report
+from src.utils.metrics import get_metrics
 from src.config.logging import logger 
+from src.config.setup import config
+from src.utils.aio import run_sync
 from typing import Optional 
 from pathlib import Path
+from typing import Tuple
 from typing import List 
 from typing import Dict 
 from typing import Any 
 from tqdm import tqdm
 import pandas as pd
-import requests
+import asyncio
 import time
 
 
-def execute_search_and_log_results(entity: str, country: str, search_topic: str) -> None:
+async def execute_search_and_log_results_async(entity: str, country: str, search_topic: str) -> None:
     """
     Executes a search based on the specified entity and country, logs relevant data from the search results.
     The function constructs a query to search for documents of a specific filetype related to the entity in the specified country,
@@ -31,7 +42,7 @@ def execute_search_and_log_results(entity: str, country: str, search_topic: str)
     """
     try:
         # Match against SQL database
-        row = find_entity_url_by_key(entity, country)
+        row = await find_entity_url_by_key_async(entity, country)
         if row is None:
             logger.error("No matching entity found in the database.")
             return
@@ -42,7 +53,7 @@ def execute_search_and_log_results(entity: str, country: str, search_topic: str)
         logger.info(f'Query: {query}')
 
         # Construct the API call with the targeted query
-        response = search_data_store(query, batch_id)
+        response = await search_data_store_async(query, batch_id)
         if response is None:
             logger.error("Failed to retrieve search data.")
             return
@@ -53,6 +64,13 @@ def execute_search_and_log_results(entity: str, country: str, search_topic: str)
         logger.error(f"An error occurred during the search process: {e}")
 
 
+def execute_search_and_log_results(entity: str, country: str, search_topic: str) -> None:
+    """
+    Blocking wrapper of `execute_search_and_log_results_async`, run on the shared background event loop.
+    """
+    run_sync(execute_search_and_log_results_async(entity, country, search_topic))
+
+
 def log_search_results(matches: List[Dict[str, Any]]) -> None:
     """
     Logs the title, snippet, and link of each match found in the search results in a structured and visually appealing format.
@@ -75,14 +93,163 @@ def log_search_results(matches: List[Dict[str, Any]]) -> None:
                     f"--------------------------------------------------\n")
         
 
-def read_and_query_csv(file_path: str, n: Optional[int] = None) -> None:
+async def query_entity_async(entity: str, country: str, search_topic: str, match_row: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, str]]:
+    """
+    Routes a single entity's query to its data store and returns the top match.
+
+    Parameters:
+    - entity (str): The name of the entity to search for.
+    - country (str): The country where the entity is located.
+    - search_topic (str): Search topic specific keywords.
+    - match_row (Optional[Dict[str, Any]]): The entity's already resolved database row. Looked up if not given.
+
+    Returns:
+    Optional[Dict[str, str]]: The entity, country, title and PDF URL of the top match, or None if nothing was found.
+    """
+    if match_row is None:
+        match_row = await find_entity_url_by_key_async(entity, country)
+    if match_row is None:
+        logger.error(f"No matching entity found in the database for {entity}, {country}.")
+        return None
+
+    batch_id = match_row['batch_id']
+    site_url = match_row['url']
+
+    query = f'{entity} {country} {search_topic} filetype:pdf site:{site_url}'
+    logger.info(f'Executing query: {query}')
+
+    # Only the top match is used, so a single result is requested
+    matches = await search_and_extract_async(query, batch_id, k=1)
+
+    if not matches:
+        logger.warning(f"No results found for {entity} in {country}.")
+        return None
+
+    top_match = matches[0]  # Assuming the first match is the top match
+    return {
+        'entity': entity,
+        'country': country,
+        'title': top_match['title'],
+        'pdf_url': top_match['link']
+    }
+
+
+def query_entity(entity: str, country: str, search_topic: str, match_row: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, str]]:
+    """
+    Blocking wrapper of `query_entity_async`, run on the shared background event loop.
+    """
+    return run_sync(query_entity_async(entity, country, search_topic, match_row))
+
+
+async def run_bulk_queries_async(keys: List[Tuple[str, str]], search_topic: str, max_in_flight: int) -> List[Optional[Dict[str, str]]]:
+    """
+    Runs `query_entity_async` for many entities on one event loop, with at most `max_in_flight`
+    searches outstanding at a time. All entities are resolved against the database up front
+    in a single bulk lookup.
+
+    Parameters:
+    - keys (List[Tuple[str, str]]): The (entity, country) pairs to query.
+    - search_topic (str): Search topic specific keywords.
+    - max_in_flight (int): The maximum number of queries running at the same time.
+
+    Returns:
+    List[Optional[Dict[str, str]]]: One result per input key, in input order.
+    """
+    metrics = get_metrics()
+    start = time.perf_counter()
+    match_rows = await find_entity_urls_by_keys_async(keys)
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def run_one(entity: str, country: str, pbar: tqdm) -> Optional[Dict[str, str]]:
+        try:
+            match_row = match_rows.get((entity, country))
+            if match_row is None:
+                metrics.inc("unmatched", "query.entity")
+                logger.error(f"No matching entity found in the database for {entity}, {country}.")
+                return None
+            async with semaphore:
+                result = await query_entity_async(entity, country, search_topic, match_row)
+            metrics.inc("found" if result else "not_found", "query.entity")
+            return result
+        except Exception as e:
+            metrics.record_error("query.entity")
+            logger.error(f"Query failed for {entity} in {country}: {e}")
+            return None
+        finally:
+            pbar.update(1)
+
+    with tqdm(total=len(keys), desc="Querying entities", unit="query") as pbar:
+        results = await asyncio.gather(*(run_one(entity, country, pbar) for entity, country in keys))
+
+    elapsed = time.perf_counter() - start
+    qps = len(keys) / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Ran {len(keys)} queries in {elapsed:.1f}s ({qps:.1f} queries/sec, max {max_in_flight} in flight).")
+    cache = get_search_cache()
+    if cache is not None:
+        stats = cache.stats()
+        logger.info(f"Search cache: {stats['hits']} hits, {stats['misses']} misses.")
+    return list(results)
+
+
+def run_bulk_queries(keys: List[Tuple[str, str]], search_topic: str, max_in_flight: int) -> List[Optional[Dict[str, str]]]:
+    """
+    Blocking wrapper of `run_bulk_queries_async`, run on the shared background event loop.
+
+    Parameters:
+    - keys (List[Tuple[str, str]]): The (entity, country) pairs to query.
+    - search_topic (str): Search topic specific keywords.
+    - max_in_flight (int): The maximum number of queries running at the same time.
+
+    Returns:
+    List[Optional[Dict[str, str]]]: One result per input key, in input order.
+    """
+    return run_sync(run_bulk_queries_async(keys, search_topic, max_in_flight))
+
+
+async def search_topic_across_data_stores_async(search_topic: str, country: Optional[str] = None, k: int = 10,
+                                               data_store_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Searches a topic across many batch data stores at once, e.g. 'Graduate Handbook' for
+    every university in a country, and returns the merged global top k.
+
+    Parameters:
+    - search_topic (str): Search topic specific keywords.
+    - country (Optional[str]): Only search the batches of this country, and add it to the query.
+    - k (int): The number of results to return.
+    - data_store_ids (Optional[List[str]]): The data stores to search. Looked up from the database if not given.
+
+    Returns:
+    List[Dict[str, Any]]: The top k results with title, snippet, link, score and the data stores they came from.
+    """
+    if data_store_ids is None:
+        data_store_ids = await asyncio.to_thread(find_batch_ids, country)
+    if not data_store_ids:
+        logger.warning(f"No data stores found for country {country}.")
+        return []
+
+    query = f'{search_topic} {country} filetype:pdf' if country else f'{search_topic} filetype:pdf'
+    logger.info(f"Fan-out query over {len(data_store_ids)} data stores: {query}")
+    return await fan_out_search_async(query, data_store_ids, k)
+
+
+def search_topic_across_data_stores(search_topic: str, country: Optional[str] = None, k: int = 10,
+                                    data_store_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Blocking wrapper of `search_topic_across_data_stores_async`, run on the shared background event loop.
+    """
+    return run_sync(search_topic_across_data_stores_async(search_topic, country, k, data_store_ids))
+
+
+def read_and_query_csv(file_path: str, n: Optional[int] = None, max_in_flight: Optional[int] = None) -> None:
     """
     Reads entities from a CSV file, constructs queries for each entity and country,
-    and executes searches. The top result from each search is saved into a separate CSV file.
+    and executes searches concurrently. The top result from each search is saved into a separate CSV file,
+    in the same order as the input rows.
 
     Parameters:
     - file_path (str): The file path to the CSV containing entities and their URLs.
     - n (Optional[int]): The number of rows to process. If None, process all rows.
+    - max_in_flight (Optional[int]): The maximum number of concurrent queries. Defaults to `query_max_in_flight` from the config.
 
     Returns:
     None
@@ -91,38 +258,12 @@ def read_and_query_csv(file_path: str, n: Optional[int] = None) -> None:
         df = pd.read_csv(file_path)
         if n is not None:
             df = df.head(n)
-        
-        results = []
-
-        for _, row in df.iterrows():
-            entity = row['entity']
-            country = row['country']
-            search_topic = 'Graduate Handbook'  # Adjusted search topic
-
-            match_row = find_entity_url_by_key(entity, country)
-            if match_row is None:
-                logger.error(f"No matching entity found in the database for {entity}, {country}.")
-                continue
 
-            batch_id = match_row['batch_id']
-            site_url = match_row['url']
+        search_topic = 'Graduate Handbook'  # Adjusted search topic
+        max_in_flight = max_in_flight or config.QUERY_MAX_IN_FLIGHT
+        keys = list(zip(df['entity'], df['country']))
 
-            query = f'{entity} {country} {search_topic} filetype:pdf site:{site_url}'
-            logger.info(f'Executing query: {query}')
-
-            response = search_data_store(query, batch_id)
-            matches = extract_relevant_data(response)  # Adjusted to use extract_relevant_data
-
-            if matches:
-                top_match = matches[0]  # Assuming the first match is the top match
-                results.append({
-                    'entity': entity,
-                    'country': country,
-                    'title': top_match['title'],
-                    'pdf_url': top_match['link']
-                })
-            else:
-                logger.warning(f"No results found for {entity} in {country}.")
+        results = [result for result in run_bulk_queries(keys, search_topic, max_in_flight) if result]
 
         if results:
             results_df = pd.DataFrame(results)
@@ -137,7 +278,9 @@ def read_and_query_csv(file_path: str, n: Optional[int] = None) -> None:
 
 def download_pdfs_from_csv(csv_path: str, save_dir: str) -> None:
     """
-    Reads the results CSV file and downloads PDFs from the provided URLs, with retries and progress indication.
+    Reads the results CSV file and downloads PDFs from the provided URLs concurrently, with retries and progress indication.
+    Unchanged PDFs are revalidated with conditional requests instead of re-downloaded, identical documents
+    are stored once under `save_dir/objects`, and interrupted downloads are resumed.
 
     Parameters:
     - csv_path (str): The path to the CSV file containing the results.
@@ -154,42 +297,37 @@ def download_pdfs_from_csv(csv_path: str, save_dir: str) -> None:
 
     Path(save_dir).mkdir(parents=True, exist_ok=True)
 
-    # Setup tqdm progress bar
-    pbar = tqdm(df.iterrows(), total=len(df), desc="Downloading PDFs")
-
-    for _, row in pbar:
+    items = []
+    for _, row in df.iterrows():
         pdf_url = row['pdf_url']
         entity = row.get('entity', 'default_entity').replace(' ', '_')
         filename = f"{entity}.pdf"
-        filepath = Path(save_dir) / filename
-        
-        success = False
-        retries = 3
-        for attempt in range(1, retries + 1):
-            try:
-                response = requests.get(pdf_url, timeout=attempt * 5)  # Gradually increasing timeout
-                response.raise_for_status()  # Raise an exception for HTTP errors
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
-                success = True
-                break
-            except (ConnectionError, HTTPError) as e:
-                logger.error(f"Attempt {attempt} failed for {pdf_url}: {e}")
-                time.sleep(2 ** attempt)  # Exponential backoff
-            except Exception as e:
-                logger.error(f"Unexpected error occurred for {pdf_url}: {e}")
-                break  # Break on unknown errors
-
-        if not success:
-            logger.error(f"Failed to download PDF after {retries} attempts: {pdf_url}")
+        items.append((pdf_url, str(Path(save_dir) / filename)))
+
+    downloader = PdfDownloader(save_dir, max_workers=config.DOWNLOAD_MAX_WORKERS, per_host=config.DOWNLOAD_PER_HOST)
+    try:
+        results = downloader.download_all(items)
+    finally:
+        downloader.close()
+
+    failed = sum(1 for status in results.values() if status == FAILED)
+    logger.info(f"{len(results) - failed} of {len(results)} PDFs available in {save_dir}.")
 
 
 if __name__ == '__main__':
+    warm_up_search_client()
+    metrics = get_metrics()
+
     entity = 'Brown University'
     country = 'United States'
     search_topic = 'Graduate Handbook'
     execute_search_and_log_results(entity, country, search_topic)
     
-    # Test Bulk Queries 
-    read_and_query_csv('./data/entities.csv', 25)
-    download_pdfs_from_csv('./data/results.csv', './data/pdfs')
\ No newline at end of file
+    try:
+        # Test Bulk Queries 
+        with metrics.track("stage.query"):
+            read_and_query_csv('./data/entities.csv', 25)
+        with metrics.track("stage.download"):
+            download_pdfs_from_csv('./data/results.csv', './data/pdfs')
+    finally:
+        write_metrics_report("query")
\ No newline at end of file
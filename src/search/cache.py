@@ -0,0 +1,151 @@
+from src.config.logging import logger
+from src.config.setup import config
+from typing import Optional
+from typing import List
+from typing import Dict
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+
+
+# Number of writes between checks of the cache size
+EVICTION_INTERVAL = 100
+
+
+class SearchCache:
+    """
+    Persistent, size-bounded cache of extracted search results backed by SQLite.
+
+    Entries expire after `ttl` seconds. When the cache holds more than `max_entries`
+    entries, the least recently used ones are evicted (checked every `EVICTION_INTERVAL` writes).
+    """
+
+    def __init__(self, path: str, ttl: int = 86400, max_entries: int = 100000):
+        """
+        Args:
+            path (str): The SQLite database file.
+            ttl (int): Seconds an entry stays valid.
+            max_entries (int): Maximum number of entries kept.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, results TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_accessed_at ON search_cache (accessed_at)")
+        self._connection.commit()
+
+    @staticmethod
+    def make_key(query: str, data_store_id: str, k: int, spec: str) -> str:
+        """
+        Builds the cache key from the query, data store, number of results `k` and search spec.
+        Queries are lowercased and whitespace-normalized first.
+
+        Returns:
+            str: The hex SHA-256 of the normalized key fields.
+        """
+        normalized_query = " ".join(query.lower().split())
+        raw = json.dumps([normalized_query, data_store_id, k, spec])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, query: str, data_store_id: str, k: int, spec: str) -> Optional[List[Dict[str, str]]]:
+        """
+        Returns the cached results for a search, or None on a miss or expired entry.
+        """
+        key = self.make_key(query, data_store_id, k, spec)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT results, created_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE search_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, query: str, data_store_id: str, k: int, spec: str, results: List[Dict[str, str]]) -> None:
+        """
+        Stores the results for a search and evicts the least recently used entries if the cache is full.
+        """
+        key = self.make_key(query, data_store_id, k, spec)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO search_cache (key, results, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(results), now, now)
+            )
+            self._writes += 1
+            # Counting is a table scan, so the size bound is only enforced every EVICTION_INTERVAL writes
+            if self._writes % EVICTION_INTERVAL == 0:
+                self._evict_locked()
+            self._connection.commit()
+
+    def _evict_locked(self) -> None:
+        count = self._connection.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        if count > self.max_entries:
+            self._connection.execute(
+                "DELETE FROM search_cache WHERE key IN "
+                "(SELECT key FROM search_cache ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def purge_expired(self) -> int:
+        """
+        Deletes all expired entries.
+
+        Returns:
+            int: The number of entries deleted.
+        """
+        with self._lock:
+            cursor = self._connection.execute("DELETE FROM search_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            self._connection.commit()
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit and miss counters since the cache was opened.
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> Optional[SearchCache]:
+    """
+    Returns the process-wide search cache, or None if caching is disabled in the config.
+
+    Returns:
+        Optional[SearchCache]: The shared search cache.
+    """
+    global _cache
+    if not config.SEARCH_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SearchCache(config.SEARCH_CACHE_PATH, config.SEARCH_CACHE_TTL, config.SEARCH_CACHE_MAX_ENTRIES)
+            logger.info(f"Search cache opened at {config.SEARCH_CACHE_PATH}.")
+        return _cache
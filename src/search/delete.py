@@ -1,6 +1,8 @@
-from src.utils.access import create_headers
+from src.utils.rest import discovery_engine_resource_url
+from src.utils.rest import discovery_engine_url
+from src.utils.rest import get_rest_client
 from src.config.logging import logger
-from src.config.setup import config
+from typing import Optional
 from typing import List
 from typing import Dict
 from typing import Any
@@ -14,11 +16,10 @@ def list_apps() -> List[Dict[str, Any]]:
     Returns:
         List[Dict[str, Any]]: A list of engines if successful, an empty list otherwise.
     """
-    url = f"https://discoveryengine.googleapis.com/v1/projects/{config.PROJECT_ID}/locations/global/collections/default_collection/engines"
-    headers = create_headers()
+    url = discovery_engine_url("engines", version="v1")
     params = {'filter': 'solution_type=SOLUTION_TYPE_SEARCH'}
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = get_rest_client().get(url, params=params)
         response.raise_for_status()  # Raises an HTTPError if the response was an error
         content = response.json()
         engines = content.get('engines', [])
@@ -29,7 +30,7 @@ def list_apps() -> List[Dict[str, Any]]:
         return []
 
 
-def delete_app(name: str) -> requests.Response:
+def delete_app(name: str) -> Optional[requests.Response]:
     """
     Deletes a specified app by name.
 
@@ -37,12 +38,12 @@ def delete_app(name: str) -> requests.Response:
         name (str): The name of the app to delete.
 
     Returns:
-        requests.Response: The response object from the delete request.
+        Optional[requests.Response]: The response object from the delete request, None if no response was received.
     """
-    url = f"https://discoveryengine.googleapis.com/v1/{name}"
-    headers = create_headers()
+    url = discovery_engine_resource_url(name)
+    response = None
     try:
-        response = requests.delete(url, headers=headers)
+        response = get_rest_client().delete(url)
         response.raise_for_status()
         logger.info(f"Successfully deleted app: {name}")
         return response
@@ -58,11 +59,10 @@ def list_data_stores() -> List[Dict[str, Any]]:
     Returns:
         List[Dict[str, Any]]: A list of dataStores if successful, an empty list otherwise.
     """
-    url = f"https://discoveryengine.googleapis.com/v1/projects/{config.PROJECT_ID}/locations/global/collections/default_collection/dataStores"
-    headers = create_headers()
+    url = discovery_engine_url("dataStores", version="v1")
     params = {'filter': 'solution_type:SOLUTION_TYPE_SEARCH'}
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = get_rest_client().get(url, params=params)
         response.raise_for_status()
         content = response.json()
         data_stores = content.get('dataStores', [])
@@ -73,7 +73,7 @@ def list_data_stores() -> List[Dict[str, Any]]:
         return []
 
 
-def delete_data_store(name: str) -> requests.Response:
+def delete_data_store(name: str) -> Optional[requests.Response]:
     """
     Deletes a specified data store by name.
 
@@ -81,12 +81,12 @@ def delete_data_store(name: str) -> requests.Response:
         name (str): The name of the data store to delete.
 
     Returns:
-        requests.Response: The response object from the delete request.
+        Optional[requests.Response]: The response object from the delete request, None if no response was received.
     """
-    url = f"https://discoveryengine.googleapis.com/v1/{name}"
-    headers = create_headers()
+    url = discovery_engine_resource_url(name)
+    response = None
     try:
-        response = requests.delete(url, headers=headers)
+        response = get_rest_client().delete(url)
         response.raise_for_status()
         logger.info(f"Successfully deleted data store: {name}")
         return response
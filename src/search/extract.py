@@ -0,0 +1,60 @@
+from google.cloud import discoveryengine_v1beta as discoveryengine
+from typing import Optional
+from typing import List
+from typing import Dict
+from typing import Any
+
+
+class SearchHit:
+    """
+    Compact record of one search result: the title, first snippet and link from the
+    document's `derivedStructData`. Missing fields are empty strings.
+    """
+
+    __slots__ = ("title", "snippet", "link")
+
+    def __init__(self, title: str = "", snippet: str = "", link: str = ""):
+        self.title = title
+        self.snippet = snippet
+        self.link = link
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"title": self.title, "snippet": self.snippet, "link": self.link}
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, SearchHit):
+            return NotImplemented
+        return (self.title, self.snippet, self.link) == (other.title, other.snippet, other.link)
+
+    def __repr__(self) -> str:
+        return f"SearchHit(title={self.title!r}, snippet={self.snippet!r}, link={self.link!r})"
+
+
+def extract_hits(response: Optional[discoveryengine.SearchResponse]) -> List[SearchHit]:
+    """
+    Extracts title, first snippet and link of every result, reading the three fields directly
+    from the raw `derivedStructData` Struct instead of converting whole documents to dicts.
+
+    Args:
+        response (Optional[discoveryengine.SearchResponse]): A page of search results.
+
+    Returns:
+        List[SearchHit]: One hit per result, in rank order. Empty if the response is None.
+    """
+    if response is None:
+        return []
+
+    hits = []
+    for result in discoveryengine.SearchResponse.pb(response).results:
+        fields = result.document.derived_struct_data.fields
+        title = fields["title"].string_value if "title" in fields else ""
+        link = fields["link"].string_value if "link" in fields else ""
+        snippet = ""
+        if "snippets" in fields:
+            snippets = fields["snippets"].list_value.values
+            if snippets:
+                first = snippets[0].struct_value.fields
+                if "snippet" in first:
+                    snippet = first["snippet"].string_value
+        hits.append(SearchHit(title, snippet, link))
+    return hits
@@ -0,0 +1,125 @@
+from src.search.site_search import search_and_extract_async
+from src.utils.metrics import get_metrics
+from src.config.logging import logger
+from src.config.setup import config
+from src.utils.aio import run_sync
+from typing import Optional
+from typing import List
+from typing import Dict
+from typing import Any
+import asyncio
+import time
+
+
+# Rank constant of reciprocal rank fusion; larger values flatten the weight of top ranks
+RRF_K = 60
+
+
+def normalize_link(link: str) -> str:
+    """Returns the key results are deduplicated by: the link without surrounding whitespace or a trailing slash."""
+    return link.strip().rstrip('/')
+
+
+def merge_ranked_results(results_by_store: Dict[str, List[Dict[str, str]]], k: int) -> List[Dict[str, Any]]:
+    """
+    Merges per-store result lists into one global ranking with reciprocal rank fusion.
+
+    Every result scores 1 / (RRF_K + rank) in its store's list, and scores of the same link
+    found in several stores are added up. The title and snippet of the best ranked copy are kept.
+
+    Args:
+        results_by_store (Dict[str, List[Dict[str, str]]]): Each store's results in rank order.
+        k (int): The number of results to return.
+
+    Returns:
+        List[Dict[str, Any]]: The top k results with title, snippet, link, fused score, best rank and the data stores they were found in.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for data_store_id, results in results_by_store.items():
+        for rank, result in enumerate(results, start=1):
+            link = result.get('link')
+            if not link:
+                continue
+            key = normalize_link(link)
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = {**result, "score": 0.0, "best_rank": rank, "data_store_ids": []}
+            elif rank < entry["best_rank"]:
+                entry.update(title=result.get('title', ''), snippet=result.get('snippet', ''), best_rank=rank)
+            entry["score"] += 1.0 / (RRF_K + rank)
+            entry["data_store_ids"].append(data_store_id)
+
+    ranked = sorted(merged.values(), key=lambda entry: (-entry["score"], entry["best_rank"]))
+    return ranked[:k]
+
+
+async def fan_out_search_async(search_query: str, data_store_ids: List[str], k: int = 10, timeout: Optional[float] = None,
+                               max_concurrency: Optional[int] = None, overall_timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Searches several data stores concurrently and returns the merged, deduplicated global top k.
+
+    All stores are searched at once, up to `max_concurrency`, so the call takes about as long as the
+    slowest store. Each store has `timeout` seconds to answer, counted from when its search gets a
+    slot. Once `overall_timeout` has passed, searches still running or waiting for a slot are
+    cancelled and the results in hand are merged. Stores that fail, time out or are cut off are left
+    out of the ranking and counted as errors, timeouts or cancelled.
+
+    Args:
+        search_query (str): The search query string.
+        data_store_ids (List[str]): The data stores to search.
+        k (int): The number of results to return.
+        timeout (Optional[float]): Seconds each store has to answer. Defaults to `fanout_store_timeout` from the config.
+        max_concurrency (Optional[int]): Maximum searches in flight. Defaults to the number of stores, capped at `fanout_max_in_flight` from the config.
+        overall_timeout (Optional[float]): Seconds the whole fan-out may take. Defaults to `fanout_timeout` from the config.
+
+    Returns:
+        List[Dict[str, Any]]: The top k results, see `merge_ranked_results`.
+    """
+    data_store_ids = list(dict.fromkeys(data_store_ids))
+    if not data_store_ids:
+        return []
+    timeout = timeout or config.FANOUT_STORE_TIMEOUT
+    overall_timeout = overall_timeout or config.FANOUT_TIMEOUT
+    semaphore = asyncio.Semaphore(max_concurrency or min(len(data_store_ids), config.FANOUT_MAX_IN_FLIGHT))
+    metrics = get_metrics()
+    start = time.perf_counter()
+
+    async def search_store(data_store_id: str) -> List[Dict[str, str]]:
+        try:
+            async with semaphore:
+                return await asyncio.wait_for(search_and_extract_async(search_query, data_store_id, k), timeout)
+        except asyncio.TimeoutError:
+            metrics.inc("timeouts", "search.fan_out")
+            logger.warning(f"Data store {data_store_id} did not answer within {timeout}s.")
+            return []
+        except Exception as e:
+            metrics.record_error("search.fan_out")
+            logger.error(f"Search of data store {data_store_id} failed: {e}")
+            return []
+
+    with metrics.track("search.fan_out"):
+        tasks = {data_store_id: asyncio.ensure_future(search_store(data_store_id)) for data_store_id in data_store_ids}
+        _, pending = await asyncio.wait(tasks.values(), timeout=overall_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    if pending:
+        metrics.inc("cancelled", "search.fan_out", len(pending))
+        logger.warning(f"Fan-out deadline of {overall_timeout}s reached; {len(pending)} of {len(data_store_ids)} "
+                       f"data stores cut off.")
+
+    results = {data_store_id: task.result() for data_store_id, task in tasks.items() if task not in pending}
+    merged = merge_ranked_results(results, k)
+
+    answered = sum(1 for result in results.values() if result)
+    logger.info(f"Fan-out search over {len(data_store_ids)} data stores took {time.perf_counter() - start:.2f}s; "
+                f"{answered} returned results, {len(merged)} merged results kept.")
+    return merged
+
+
+def fan_out_search(search_query: str, data_store_ids: List[str], k: int = 10, timeout: Optional[float] = None,
+                   max_concurrency: Optional[int] = None, overall_timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Blocking wrapper of `fan_out_search_async`, run on the shared background event loop.
+    """
+    return run_sync(fan_out_search_async(search_query, data_store_ids, k, timeout, max_concurrency, overall_timeout))
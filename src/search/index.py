@@ -1,11 +1,24 @@
+from src.utils.rest import discovery_engine_url
+from src.utils.rest import get_rest_client
+from src.utils.metrics import get_metrics
+from concurrent.futures import ThreadPoolExecutor
 from src.config.logging import logger
 from src.config.setup import config
 from typing import Optional
 from typing import Dict
 from typing import List
 from typing import Any
-import subprocess
 import requests
+import time
+
+
+# Maximum number of target sites accepted by a single batchCreate request
+MAX_TARGET_SITES_PER_REQUEST = 20
+# Status codes worth retrying with the same payload
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# Status codes pointing at a bad or duplicate site (INVALID_ARGUMENT, ALREADY_EXISTS), worth splitting the chunk for.
+# Any other rejection (401, 403, 404, ...) concerns the data store itself and fails the whole chunk.
+SPLIT_STATUS_CODES = (400, 409)
 
 
 def create_search_app(data_store_id) -> Optional[Dict[str, Any]]:
@@ -19,14 +32,7 @@ def create_search_app(data_store_id) -> Optional[Dict[str, Any]]:
         dict: A dictionary containing the response data from the API if the request is successful.
         None: If the request fails.
     """
-    url = f"https://discoveryengine.googleapis.com/v1alpha/projects/{config.PROJECT_ID}/locations/global/collections/default_collection/engines?engineId={data_store_id}"
-
-    # Headers for the request
-    headers = {
-        "Authorization": f"Bearer {config.ACCESS_TOKEN}",
-        "Content-Type": "application/json",
-        "X-Goog-User-Project": config.PROJECT_ID
-    }
+    url = discovery_engine_url(f"engines?engineId={data_store_id}")
 
     # Request payload
     data = {
@@ -40,7 +46,11 @@ def create_search_app(data_store_id) -> Optional[Dict[str, Any]]:
     }
 
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = get_rest_client().post(url, json=data)
+        if response.status_code == 409:
+            # Created by an earlier run whose indexing did not complete
+            logger.info(f"Site search app for batch {data_store_id} already exists.")
+            return response.json()
         response.raise_for_status()  # Raises an HTTPError if the HTTP request returned an unsuccessful status code
         logger.info(f"Site search app created successfully for batch {data_store_id}.")
         return response.json()
@@ -49,37 +59,6 @@ def create_search_app(data_store_id) -> Optional[Dict[str, Any]]:
         return None
     
 
-def fetch_access_token() -> Optional[str]:
-    """
-    Fetch an access token for authentication.
-    Returns:
-        Optional[str]: The fetched access token if successful, None otherwise.
-    """
-    cmd = ["gcloud", "auth", "print-access-token"]
-    try:
-        token = subprocess.check_output(cmd).decode('utf-8').strip()
-        return token
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to fetch access token: {e}")
-        return None
-
-
-def create_headers() -> Dict[str, str]:
-    """
-    Create headers for the HTTP request including authorization.
-    Returns:
-        Dict[str, str]: Headers for the request.
-    """
-    token = fetch_access_token()
-    if token is None:
-        raise RuntimeError("Failed to obtain access token")
-    return {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-        "X-Goog-User-Project": config.PROJECT_ID
-    }
-
-
 def create_request_body(uri_patterns: List[str], data_store_id: str) -> Dict[str, Any]:
     """
     Create the request body for target sites batch creation.
@@ -115,12 +94,7 @@ def extract_batch_id(filepath: str) -> str:
 
 
 def create_data_store(batch_id):
-    url = f"https://discoveryengine.googleapis.com/v1alpha/projects/{config.PROJECT_ID}/locations/global/collections/default_collection/dataStores?dataStoreId={batch_id}"
-    headers = {
-            "Authorization": f"Bearer {fetch_access_token()}",
-            "Content-Type": "application/json",
-            "X-Goog-User-Project": config.PROJECT_ID
-        }
+    url = discovery_engine_url(f"dataStores?dataStoreId={batch_id}")
     data = {
         'displayName': f'site_search_{batch_id}',
         'industryVertical': 'GENERIC',
@@ -129,7 +103,7 @@ def create_data_store(batch_id):
         'searchTier': 'STANDARD'
         
     }
-    response = requests.post(url, headers=headers, json=data)
+    response = get_rest_client().post(url, json=data)
     return response
 
 
@@ -141,13 +115,98 @@ def post_target_sites(data: Dict[str, Any], data_store_id: str) -> Optional[Dict
     Returns:
         Optional[Dict[str, Any]]: The JSON response if successful, None otherwise.
     """
-    url = f"https://discoveryengine.googleapis.com/v1alpha/projects/{config.PROJECT_ID}/locations/global/collections/default_collection/dataStores/{data_store_id}/siteSearchEngine/targetSites:batchCreate"
-    headers = create_headers()
-    
-    
-    response = requests.post(url, headers=headers, json=data)
-    #response.raise_for_status()  # This will raise an HTTPError if the response was an error
-    return response.json()
+    url = discovery_engine_url(f"dataStores/{data_store_id}/siteSearchEngine/targetSites:batchCreate")
+    try:
+        response = get_rest_client().post(url, json=data)
+        response.raise_for_status()  # This will raise an HTTPError if the response was an error
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to post target sites for data store {data_store_id}: {e}")
+        return None
+
+
+def _submit_target_site_chunk(uri_patterns: List[str], data_store_id: str, retries: int = 3) -> Dict[str, Optional[str]]:
+    """
+    Posts one chunk of target sites. Throttling and server errors are retried with backoff.
+    A rejection of some of the sites (400, 409) splits the chunk in half so only the offending
+    sites end up failing; a site that already exists counts as accepted. Any other error fails
+    the whole chunk.
+
+    Args:
+        uri_patterns (List[str]): The URI patterns in this chunk.
+        data_store_id (str): The data store to add the sites to.
+        retries (int): Attempts per chunk for retryable errors.
+
+    Returns:
+        Dict[str, Optional[str]]: None for each accepted URI pattern, an error message otherwise.
+    """
+    url = discovery_engine_url(f"dataStores/{data_store_id}/siteSearchEngine/targetSites:batchCreate")
+    error = None
+    status_code = None
+    for attempt in range(1, retries + 1):
+        try:
+            response = get_rest_client().post(url, json=create_request_body(uri_patterns, data_store_id))
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+        else:
+            if response.ok:
+                return {uri_pattern: None for uri_pattern in uri_patterns}
+            status_code = response.status_code
+            error = f"HTTP {status_code}: {response.text[:200]}"
+            if status_code not in RETRYABLE_STATUS_CODES:
+                break
+        if attempt < retries:
+            get_metrics().record_retry("search.target_sites")
+            time.sleep(2 ** attempt)  # Exponential backoff
+
+    if status_code not in SPLIT_STATUS_CODES:
+        logger.error(f"Failed to post {len(uri_patterns)} target sites for data store {data_store_id}: {error}")
+        return {uri_pattern: error for uri_pattern in uri_patterns}
+    if len(uri_patterns) == 1:
+        if status_code == 409:
+            logger.info(f"Target site {uri_patterns[0]} already exists in data store {data_store_id}.")
+            return {uri_patterns[0]: None}
+        logger.error(f"Target site {uri_patterns[0]} rejected for data store {data_store_id}: {error}")
+        return {uri_patterns[0]: error}
+
+    get_metrics().inc("splits", "search.target_sites")
+    middle = len(uri_patterns) // 2
+    results = _submit_target_site_chunk(uri_patterns[:middle], data_store_id, retries)
+    results.update(_submit_target_site_chunk(uri_patterns[middle:], data_store_id, retries))
+    return results
+
+
+def submit_target_sites(uri_patterns: List[str], data_store_id: str, max_concurrency: Optional[int] = None,
+                        chunk_size: int = MAX_TARGET_SITES_PER_REQUEST) -> Dict[str, Optional[str]]:
+    """
+    Adds target sites to a data store, posting chunks of the largest size the batchCreate API
+    accepts concurrently. Only failing chunks are split and retried.
+
+    Args:
+        uri_patterns (List[str]): The URI patterns to include.
+        data_store_id (str): The data store to add the sites to.
+        max_concurrency (Optional[int]): Maximum concurrent requests for this data store. Defaults to `target_site_max_concurrency` from the config.
+        chunk_size (int): Target sites per request, capped at the API limit.
+
+    Returns:
+        Dict[str, Optional[str]]: None for each accepted URI pattern, an error message otherwise.
+    """
+    max_concurrency = max_concurrency or config.TARGET_SITE_MAX_CONCURRENCY
+    chunk_size = min(chunk_size, MAX_TARGET_SITES_PER_REQUEST)
+    metrics = get_metrics()
+    results = {}
+    with metrics.track("search.target_sites"):
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = [executor.submit(_submit_target_site_chunk, chunk, data_store_id)
+                       for chunk in chunk_data(uri_patterns, chunk_size)]
+            for future in futures:
+                results.update(future.result())
+
+    failed = sum(1 for error in results.values() if error is not None)
+    if failed:
+        metrics.record_error("search.target_sites")
+    logger.info(f"Posted {len(results) - failed} of {len(results)} target sites for data store {data_store_id}.")
+    return results
 
 
 def chunk_data(data, size):
@@ -1,69 +1,292 @@
 from google.cloud import discoveryengine_v1beta as discoveryengine
 from google.api_core.client_options import ClientOptions
-from google.protobuf import json_format
+from src.search.cache import get_search_cache
+from src.search.extract import extract_hits
+from src.search.extract import SearchHit
+from src.utils.metrics import get_metrics
 from src.config.logging import logger 
 from src.config.setup import config
+from src.utils.aio import run_sync
+from typing import AsyncIterator
 from typing import Optional
+from typing import Iterator
 from typing import List
 from typing import Dict
+from typing import Any
+from functools import lru_cache
+import threading
+import asyncio
+import weakref
 
 
 LOCATION = "global" 
 
+# Search clients are expensive to create (gRPC channel, auth, TLS handshake), so one client per
+# API endpoint is kept for the lifetime of the process. Async clients are bound to the event loop
+# they were created on, so they are kept per loop.
+_search_clients_lock = threading.Lock()
+_async_search_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+_async_search_client_overrides: Dict[str, Any] = {}
 
-def search_data_store(search_query: str, data_store_id: str) -> Optional[discoveryengine.SearchResponse]:
+# Spec protos are identical for every query, so they are built once.
+CONTENT_SEARCH_SPEC = discoveryengine.SearchRequest.ContentSearchSpec(
+    snippet_spec=discoveryengine.SearchRequest.ContentSearchSpec.SnippetSpec(
+        return_snippet=True
+    )
+)
+QUERY_EXPANSION_SPEC = discoveryengine.SearchRequest.QueryExpansionSpec(
+    condition=discoveryengine.SearchRequest.QueryExpansionSpec.Condition.AUTO,
+)
+SPELL_CORRECTION_SPEC = discoveryengine.SearchRequest.SpellCorrectionSpec(
+    mode=discoveryengine.SearchRequest.SpellCorrectionSpec.Mode.AUTO
+)
+# Identifies the specs above in search cache keys; change it whenever they change.
+SEARCH_SPEC_KEY = "snippet:expansion_auto:spell_auto"
+
+# Results per page when the caller does not say how many it needs
+DEFAULT_PAGE_SIZE = 5
+# Largest page the search API returns; bigger page sizes are capped to this
+MAX_PAGE_SIZE = 100
+
+
+def get_api_endpoint(location: str = LOCATION) -> Optional[str]:
     """
-    Search the data store using Google Cloud's Discovery Engine API.
+    Returns the regional Discovery Engine endpoint for a location, or None for the global endpoint.
+    """
+    return f"{location}-discoveryengine.googleapis.com" if location != "global" else None
+
+
+def get_async_search_client(location: str = LOCATION) -> discoveryengine.SearchServiceAsyncClient:
+    """
+    Returns the shared async search client for a location on the running event loop, creating it on first use.
 
     Args:
-        search_query (str): The search query string.
+        location (str): The Discovery Engine location.
 
     Returns:
-        discoveryengine.SearchResponse: The search response from the Discovery Engine API.
+        discoveryengine.SearchServiceAsyncClient: The cached async search client.
+    """
+    api_endpoint = get_api_endpoint(location)
+    key = api_endpoint or "global"
+    loop = asyncio.get_running_loop()
+    with _search_clients_lock:
+        override = _async_search_client_overrides.get(key)
+        if override is not None:
+            return override
+        clients = _async_search_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client_options = ClientOptions(api_endpoint=api_endpoint) if api_endpoint else None
+            config.load()  # Credentials must be in the environment before the client is created
+            client = discoveryengine.SearchServiceAsyncClient(client_options=client_options)
+            clients[key] = client
+            logger.info(f"Async search client created for endpoint {key}.")
+        return client
+
+
+def set_async_search_client(client: Optional[discoveryengine.SearchServiceAsyncClient], location: str = LOCATION) -> None:
+    """
+    Makes every event loop use the given async search client for a location, e.g. a local stand-in.
+    None goes back to creating one client per event loop.
+
+    Args:
+        client (Optional[discoveryengine.SearchServiceAsyncClient]): The client to use.
+        location (str): The Discovery Engine location.
+    """
+    key = get_api_endpoint(location) or "global"
+    with _search_clients_lock:
+        if client is None:
+            _async_search_client_overrides.pop(key, None)
+        else:
+            _async_search_client_overrides[key] = client
+
+
+@lru_cache(maxsize=None)
+def get_request_template(data_store_id: str, location: str = LOCATION, page_size: int = 5) -> discoveryengine.SearchRequest:
+    """
+    Returns a prebuilt search request for a data store's serving config, without the query.
+
+    Args:
+        data_store_id (str): The data store to search.
+        location (str): The Discovery Engine location.
+        page_size (int): The number of results per page.
+
+    Returns:
+        discoveryengine.SearchRequest: The request template. Callers must copy it, not mutate it.
+    """
+    serving_config = discoveryengine.SearchServiceClient.serving_config_path(
+        project=config.PROJECT_ID,
+        location=location,
+        data_store=data_store_id,
+        serving_config="default_config",
+    )
+    return discoveryengine.SearchRequest(
+        serving_config=serving_config,
+        page_size=page_size,
+        content_search_spec=CONTENT_SEARCH_SPEC,
+        query_expansion_spec=QUERY_EXPANSION_SPEC,
+        spell_correction_spec=SPELL_CORRECTION_SPEC,
+    )
+
+
+async def warm_up_search_client_async(data_store_id: Optional[str] = None, location: str = LOCATION) -> None:
     """
+    Creates the async search client ahead of the first query and, if a data store is given,
+    sends a single search so the gRPC channel is connected before real traffic starts.
+
+    Args:
+        data_store_id (Optional[str]): A data store to send the warm-up query to.
+        location (str): The Discovery Engine location.
+    """
+    client = get_async_search_client(location)
+    if data_store_id is None:
+        return
     try:
-        client_options = (
-            ClientOptions(api_endpoint=f"{LOCATION}-discoveryengine.googleapis.com")
-            if LOCATION != "global"
-            else None
-        )
-
-        client = discoveryengine.SearchServiceClient(client_options=client_options)
-
-        serving_config = client.serving_config_path(
-            project=config.PROJECT_ID,
-            location=LOCATION,
-            data_store=data_store_id,
-            serving_config="default_config",
-        )
-
-        content_search_spec = discoveryengine.SearchRequest.ContentSearchSpec(
-            snippet_spec=discoveryengine.SearchRequest.ContentSearchSpec.SnippetSpec(
-                return_snippet=True
-            )
-        )
-
-        request = discoveryengine.SearchRequest(
-            serving_config=serving_config,
-            query=search_query,
-            page_size=5,
-            content_search_spec=content_search_spec,
-            query_expansion_spec=discoveryengine.SearchRequest.QueryExpansionSpec(
-                condition=discoveryengine.SearchRequest.QueryExpansionSpec.Condition.AUTO,
-            ),
-            spell_correction_spec=discoveryengine.SearchRequest.SpellCorrectionSpec(
-                mode=discoveryengine.SearchRequest.SpellCorrectionSpec.Mode.AUTO
-            ),
-        )
-
-        response = client.search(request)
-        return response
+        request = discoveryengine.SearchRequest(get_request_template(data_store_id, location), query="warmup", page_size=1)
+        await client.search(request)
+        logger.info(f"Search channel warmed up against data store {data_store_id}.")
+    except Exception as e:
+        logger.error(f"Search channel warm-up failed: {e}")
+
+
+def warm_up_search_client(data_store_id: Optional[str] = None, location: str = LOCATION) -> None:
+    """
+    Blocking wrapper of `warm_up_search_client_async`, warming the client on the shared background event loop.
+    """
+    run_sync(warm_up_search_client_async(data_store_id, location))
+
+
+def get_page_size(k: Optional[int] = None) -> int:
+    """
+    Returns the page size to request for a caller that needs `k` results: just enough for
+    k to arrive in one page, capped at `MAX_PAGE_SIZE`.
+    """
+    if k is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(k, MAX_PAGE_SIZE))
+
+
+async def fetch_search_page_async(search_query: str, data_store_id: str, page_size: int = DEFAULT_PAGE_SIZE,
+                                  page_token: str = "") -> discoveryengine.SearchResponse:
+    """
+    Fetches a single page of search results with the async Discovery Engine client. The client
+    returns a pager; only its first page is read, so no further pages are requested.
+
+    Args:
+        search_query (str): The search query string.
+        data_store_id (str): The data store to search.
+        page_size (int): The number of results per page.
+        page_token (str): The `next_page_token` of the previous page, empty for the first page.
+
+    Returns:
+        discoveryengine.SearchResponse: The page.
+
+    Raises:
+        Exception: Any error raised by the client.
+    """
+    client = get_async_search_client(LOCATION)
+    request = discoveryengine.SearchRequest(get_request_template(data_store_id, LOCATION, page_size),
+                                            query=search_query, page_token=page_token)
+    with get_metrics().track("search.query"):
+        pager = await client.search(request)
+        async for page in pager.pages:
+            return page
+
+
+async def iter_search_results_async(search_query: str, data_store_id: str, k: Optional[int] = None,
+                                    page_size: Optional[int] = None) -> AsyncIterator[SearchHit]:
+    """
+    Yields the extracted results of a search one at a time, fetching the next page only when the
+    previous one has been consumed and stopping after `k` results.
+
+    Args:
+        search_query (str): The search query string.
+        data_store_id (str): The data store to search.
+        k (Optional[int]): The maximum number of results, or None for all of them.
+        page_size (Optional[int]): Results per page. Derived from k if not given.
 
+    Yields:
+        SearchHit: The title, first snippet and link of each result, in rank order.
+    """
+    page_size = page_size or get_page_size(k)
+    page_token = ""
+    count = 0
+    while True:
+        response = await fetch_search_page_async(search_query, data_store_id, page_size, page_token)
+        for hit in extract_hits(response):
+            yield hit
+            count += 1
+            if k is not None and count >= k:
+                return
+        page_token = response.next_page_token
+        if not page_token:
+            return
+
+
+def iter_search_results(search_query: str, data_store_id: str, k: Optional[int] = None,
+                        page_size: Optional[int] = None) -> Iterator[SearchHit]:
+    """
+    Blocking counterpart of `iter_search_results_async`. Each page is fetched on the shared
+    background event loop when the caller reaches it.
+
+    Args:
+        search_query (str): The search query string.
+        data_store_id (str): The data store to search.
+        k (Optional[int]): The maximum number of results, or None for all of them.
+        page_size (Optional[int]): Results per page. Derived from k if not given.
+
+    Yields:
+        SearchHit: The title, first snippet and link of each result, in rank order.
+    """
+    page_size = page_size or get_page_size(k)
+    page_token = ""
+    count = 0
+    while True:
+        response = run_sync(fetch_search_page_async(search_query, data_store_id, page_size, page_token))
+        for hit in extract_hits(response):
+            yield hit
+            count += 1
+            if k is not None and count >= k:
+                return
+        page_token = response.next_page_token
+        if not page_token:
+            return
+
+
+async def search_data_store_async(search_query: str, data_store_id: str, page_size: int = DEFAULT_PAGE_SIZE) -> Optional[discoveryengine.SearchResponse]:
+    """
+    Search the data store using the async Discovery Engine client, returning the first page.
+
+    Args:
+        search_query (str): The search query string.
+        data_store_id (str): The data store to search.
+        page_size (int): The number of results to request.
+
+    Returns:
+        discoveryengine.SearchResponse: The search response, or None if the search failed.
+    """
+    try:
+        return await fetch_search_page_async(search_query, data_store_id, page_size)
     except Exception as e:
         logger.error(f"Error during data store search: {e}")
         return None
 
 
+def search_data_store(search_query: str, data_store_id: str) -> Optional[discoveryengine.SearchResponse]:
+    """
+    Search the data store using Google Cloud's Discovery Engine API.
+
+    Blocking wrapper of `search_data_store_async`, run on the shared background event loop.
+
+    Args:
+        search_query (str): The search query string.
+
+    Returns:
+        discoveryengine.SearchResponse: The search response from the Discovery Engine API.
+    """
+    return run_sync(search_data_store_async(search_query, data_store_id))
+
+
 def extract_relevant_data(response: Optional[discoveryengine.SearchResponse]) -> List[Dict[str, str]]:
     """
     Extracts title, snippet, and link from the search response.
@@ -74,41 +297,63 @@ def extract_relevant_data(response: Optional[discoveryengine.SearchResponse]) ->
     Returns:
         List[Dict[str, str]]: A list of dictionaries containing the extracted information.
     """
-    extracted_data = []
-
     if response is None:
         logger.error("No response received to extract data.")
-        return extracted_data
-
-    for result in response.results:
-        data = {
-            "title": "",
-            "snippet": "",
-            "link": ""
-        }
+        return []
+    return [hit.to_dict() for hit in extract_hits(response)]
 
-        # Convert protocol buffer message to JSON
-        result_json = json_format.MessageToDict(result.document._pb)
 
-        # Extracting fields from JSON
-        struct_data = result_json.get('structData', {})
-        derived_struct_data = result_json.get('derivedStructData', {})
+async def search_and_extract_async(search_query: str, data_store_id: str, k: int = DEFAULT_PAGE_SIZE) -> List[Dict[str, str]]:
+    """
+    Searches a data store and extracts title, snippet, and link from the top `k` results,
+    following result pages as needed. Repeated searches are served from the persistent search
+    cache. Failed searches are not cached.
 
-        # Extracting title
-        title = derived_struct_data.get("title")
-        if title:
-            data["title"] = title
+    Args:
+        search_query (str): The search query string.
+        data_store_id (str): The data store to search.
+        k (int): The number of results to return.
 
-        # Extracting snippet
-        snippets = derived_struct_data.get("snippets")
-        if snippets:
-                data["snippet"] = snippets[0]['snippet']
+    Returns:
+        List[Dict[str, str]]: A list of dictionaries containing the extracted information.
 
-        # Extracting link
-        link = derived_struct_data.get("link")
-        if link:
-            data["link"] = link
+    Raises:
+        Exception: Any error raised by the search client. Callers wanting best-effort results catch it.
+    """
+    metrics = get_metrics()
+    cache = get_search_cache()
+    # The cache reads and writes a SQLite file, so it is used from a worker thread to keep the event loop free
+    if cache is not None:
+        with metrics.track("search.cache_get"):
+            cached = await asyncio.to_thread(cache.get, search_query, data_store_id, k, SEARCH_SPEC_KEY)
+        if cached is not None:
+            metrics.inc("cache_hits", "search.cache_get")
+            return cached
+        metrics.inc("cache_misses", "search.cache_get")
 
-        extracted_data.append(data)
+    extracted_data = []
+    try:
+        async for hit in iter_search_results_async(search_query, data_store_id, k):
+            extracted_data.append(hit.to_dict())
+    except Exception as e:
+        logger.error(f"Error during data store search: {e}")
+        raise
 
+    if cache is not None:
+        await asyncio.to_thread(cache.set, search_query, data_store_id, k, SEARCH_SPEC_KEY, extracted_data)
     return extracted_data
+
+
+def search_and_extract(search_query: str, data_store_id: str, k: int = DEFAULT_PAGE_SIZE) -> List[Dict[str, str]]:
+    """
+    Blocking wrapper of `search_and_extract_async`, run on the shared background event loop.
+
+    Args:
+        search_query (str): The search query string.
+        data_store_id (str): The data store to search.
+        k (int): The number of results to return.
+
+    Returns:
+        List[Dict[str, str]]: A list of dictionaries containing the extracted information.
+    """
+    return run_sync(search_and_extract_async(search_query, data_store_id, k))
@@ -1,8 +1,285 @@
 from src.config.logging import logger
 from src.config.setup import config
+from datetime import timezone
 from typing import Optional
+from typing import Tuple
 from typing import Dict
 import subprocess
+import threading
+import requests
+import time
+import abc
+
+
+# Newly issued Google access tokens are valid for one hour.
+DEFAULT_TOKEN_LIFETIME = 3600
+# `gcloud auth print-access-token` hands out its cached token, which may have only minutes left.
+# This lifetime is assumed when the token's real expiry cannot be looked up.
+GCLOUD_FALLBACK_LIFETIME = 300
+# Refresh this many seconds before the cached token expires.
+DEFAULT_REFRESH_MARGIN = 300
+# With background refresh on, callers only refresh the token themselves this many seconds before it expires.
+EXPIRY_SKEW = 30
+# Seconds between background refresh attempts after one failed
+BACKGROUND_RETRY_DELAY = 30
+# Reports the remaining lifetime of an access token
+TOKEN_INFO_URL = "https://oauth2.googleapis.com/tokeninfo"
+
+
+class TokenSource(abc.ABC):
+    """
+    Base class for access token sources.
+
+    A source knows how to obtain a fresh token; caching and refreshing is handled
+    by `TokenProvider`.
+    """
+
+    @abc.abstractmethod
+    def fetch(self) -> Tuple[str, float]:
+        """
+        Fetches a fresh access token.
+
+        Returns:
+            Tuple[str, float]: The token and its expiry as a UNIX timestamp.
+        """
+
+
+class GcloudTokenSource(TokenSource):
+    """
+    Fetches access tokens by shelling out to `gcloud auth print-access-token`.
+
+    gcloud returns its cached token rather than a new one, so the token's real expiry is
+    looked up on the token info endpoint.
+    """
+
+    def __init__(self, fallback_lifetime: int = GCLOUD_FALLBACK_LIFETIME, timeout: float = 10.0):
+        """
+        Args:
+            fallback_lifetime (int): Seconds the token is assumed valid if its expiry cannot be looked up.
+            timeout (float): Timeout of the token info request in seconds.
+        """
+        self.fallback_lifetime = fallback_lifetime
+        self.timeout = timeout
+
+    def fetch(self) -> Tuple[str, float]:
+        cmd = ["gcloud", "auth", "print-access-token"]
+        token = subprocess.check_output(cmd).decode('utf-8').strip()
+        return token, self._lookup_expiry(token)
+
+    def _lookup_expiry(self, token: str) -> float:
+        now = time.time()
+        try:
+            response = requests.post(TOKEN_INFO_URL, data={"access_token": token}, timeout=self.timeout)
+            response.raise_for_status()
+            return now + int(response.json()["expires_in"])
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            logger.warning(f"Could not look up the access token's expiry, assuming {self.fallback_lifetime}s: {e}")
+            return now + self.fallback_lifetime
+
+
+class GoogleAuthTokenSource(TokenSource):
+    """
+    Fetches access tokens from google-auth application default credentials.
+    """
+
+    def __init__(self, scopes: Optional[list] = None):
+        import google.auth
+        import google.auth.transport.requests
+
+        self.scopes = scopes or ["https://www.googleapis.com/auth/cloud-platform"]
+        self.credentials, _ = google.auth.default(scopes=self.scopes)
+        self._request = google.auth.transport.requests.Request()
+
+    def fetch(self) -> Tuple[str, float]:
+        self.credentials.refresh(self._request)
+        expiry = self.credentials.expiry
+        if expiry is None:
+            return self.credentials.token, time.time() + DEFAULT_TOKEN_LIFETIME
+        # google-auth reports expiry as a naive UTC datetime
+        return self.credentials.token, expiry.replace(tzinfo=timezone.utc).timestamp()
+
+
+class FileTokenSource(TokenSource):
+    """
+    Reads an access token from a local file. Useful for offline runs and tests.
+    """
+
+    def __init__(self, path: str, lifetime: int = DEFAULT_TOKEN_LIFETIME):
+        self.path = path
+        self.lifetime = lifetime
+
+    def fetch(self) -> Tuple[str, float]:
+        with open(self.path, 'r') as file:
+            token = file.read().strip()
+        return token, time.time() + self.lifetime
+
+
+class TokenProvider:
+    """
+    Thread-safe access token cache that refreshes the token in the background
+    shortly before it expires.
+
+    A token is refreshed `refresh_margin` seconds before it expires, or halfway through
+    its remaining lifetime if it was handed out with less than twice the margin left. With
+    background refresh on, callers keep getting the cached token until it is about to expire.
+    Tokens are fetched outside the cache lock, one fetch at a time, so a slow source only
+    holds up callers that have no valid token.
+    """
+
+    def __init__(self, source: TokenSource, refresh_margin: int = DEFAULT_REFRESH_MARGIN, background_refresh: bool = True):
+        """
+        Args:
+            source (TokenSource): Where fresh tokens come from.
+            refresh_margin (int): Seconds before expiry at which the token is refreshed.
+            background_refresh (bool): Whether to refresh ahead of expiry on a daemon timer.
+        """
+        self.source = source
+        self.refresh_margin = refresh_margin
+        self.background_refresh = background_refresh
+        self._token = None
+        self._expiry = 0.0
+        self._refresh_at = 0.0
+        self._closed = False
+        self._lock = threading.Lock()  # Guards the cached token and the timer
+        self._fetch_lock = threading.Lock()  # Serializes fetches from the source
+        self._timer = None
+
+    def _current_token_locked(self) -> Optional[str]:
+        """Returns the cached token if callers may still use it without refreshing, else None."""
+        refresh_at = max(self._refresh_at, self._expiry - EXPIRY_SKEW) if self.background_refresh else self._refresh_at
+        if self._token is None or time.time() >= refresh_at:
+            return None
+        return self._token
+
+    def get_token(self) -> str:
+        """
+        Returns a valid access token, fetching a new one only if the cached token
+        is missing or about to expire.
+
+        Returns:
+            str: The access token.
+        """
+        with self._lock:
+            token = self._current_token_locked()
+        if token is not None:
+            return token
+
+        with self._fetch_lock:
+            # Another caller or the background refresh may have fetched a token meanwhile
+            with self._lock:
+                token = self._current_token_locked()
+            if token is not None:
+                return token
+            token, expiry = self.source.fetch()
+            with self._lock:
+                self._set_token_locked(token, expiry)
+            return token
+
+    def invalidate(self) -> None:
+        """
+        Drops the cached token, e.g. after the API rejected it with a 401.
+        """
+        with self._lock:
+            self._token = None
+            self._expiry = 0.0
+            self._refresh_at = 0.0
+
+    def close(self) -> None:
+        """
+        Cancels any scheduled background refresh and stops scheduling new ones.
+        """
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _set_token_locked(self, token: str, expiry: float) -> None:
+        now = time.time()
+        self._token = token
+        self._expiry = expiry
+        self._refresh_at = expiry - min(self.refresh_margin, max(expiry - now, 0) / 2)
+        logger.info(f"Access token refreshed, valid for {expiry - now:.0f}s.")
+        self._schedule_refresh_locked(self._refresh_at - now)
+
+    def _schedule_refresh_locked(self, delay: float) -> None:
+        if not self.background_refresh or self._closed:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(delay, 1), self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self) -> None:
+        try:
+            with self._fetch_lock:
+                token, expiry = self.source.fetch()
+        except Exception as e:
+            with self._lock:
+                # Retry in the background until the token is about to expire; after that,
+                # get_token() fetches a token itself.
+                delay = min(BACKGROUND_RETRY_DELAY, self._expiry - EXPIRY_SKEW - time.time())
+                if delay > 0:
+                    self._schedule_refresh_locked(delay)
+            logger.error(f"Background access token refresh failed: {e}")
+            return
+        with self._lock:
+            if self._closed:
+                return
+            self._set_token_locked(token, expiry)
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def create_token_source(kind: str) -> TokenSource:
+    """
+    Creates a token source by name.
+
+    Args:
+        kind (str): One of 'gcloud', 'google-auth' or 'file:<path>'.
+
+    Returns:
+        TokenSource: The token source.
+    """
+    if kind == "gcloud":
+        return GcloudTokenSource()
+    if kind == "google-auth":
+        return GoogleAuthTokenSource()
+    if kind.startswith("file:"):
+        return FileTokenSource(kind[len("file:"):])
+    raise ValueError(f"Unknown access token source: {kind}")
+
+
+def get_token_provider() -> TokenProvider:
+    """
+    Returns the process-wide token provider, creating it from the configured
+    token source on first use.
+
+    Returns:
+        TokenProvider: The shared token provider.
+    """
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = TokenProvider(create_token_source(config.ACCESS_TOKEN_SOURCE))
+        return _provider
+
+
+def set_token_provider(provider: Optional[TokenProvider]) -> None:
+    """
+    Replaces the process-wide token provider, e.g. with a file-backed fake.
+
+    Args:
+        provider (Optional[TokenProvider]): The new provider, or None to reset to the configured default.
+    """
+    global _provider
+    with _provider_lock:
+        if _provider is not None and _provider is not provider:
+            _provider.close()
+        _provider = provider
 
 
 def fetch_access_token() -> Optional[str]:
@@ -12,12 +289,9 @@ def fetch_access_token() -> Optional[str]:
     Returns:
         Optional[str]: The fetched access token if successful, None otherwise.
     """
-    cmd = ["gcloud", "auth", "print-access-token"]
     try:
-        token = subprocess.check_output(cmd).decode('utf-8').strip()
-        logger.info("Successfully fetched access token.")
-        return token
-    except subprocess.CalledProcessError as e:
+        return get_token_provider().get_token()
+    except Exception as e:
         logger.error(f"Failed to fetch access token: {e}")
         return None
 
@@ -41,4 +315,4 @@ def create_headers() -> Dict[str, str]:
         "Content-Type": "application/json",
         "X-Goog-User-Project": config.PROJECT_ID
     }
-    return headers
\ No newline at end of file
+    return headers
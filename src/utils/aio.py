@@ -0,0 +1,82 @@
+from src.config.logging import logger
+from typing import Coroutine
+from typing import Optional
+from typing import Any
+import threading
+import asyncio
+
+
+class EventLoopThread:
+    """
+    An asyncio event loop running forever on a daemon thread.
+
+    Lets blocking code run coroutines on one long-lived loop, so async clients (gRPC
+    channels, connection pools) are created once and shared by every caller.
+    """
+
+    def __init__(self, name: str = "event-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Runs a coroutine on the loop and blocks until it finishes.
+
+        Args:
+            coro (Coroutine): The coroutine to run.
+            timeout (Optional[float]): Seconds to wait for the result.
+
+        Returns:
+            Any: The coroutine's result.
+
+        Raises:
+            RuntimeError: If called from the loop's own thread, where blocking would deadlock.
+        """
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("Cannot block on the event loop thread; await the coroutine instead.")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def close(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+_loop_thread = None
+_loop_thread_lock = threading.Lock()
+
+
+def get_event_loop_thread() -> EventLoopThread:
+    """
+    Returns the process-wide background event loop, starting it on first use.
+
+    Returns:
+        EventLoopThread: The shared event loop thread.
+    """
+    global _loop_thread
+    with _loop_thread_lock:
+        if _loop_thread is None:
+            _loop_thread = EventLoopThread("async-search")
+            logger.info("Background event loop started.")
+        return _loop_thread
+
+
+def run_sync(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """
+    Runs a coroutine on the shared background event loop and returns its result.
+    This is how the blocking functions wrap their async counterparts.
+
+    Args:
+        coro (Coroutine): The coroutine to run.
+        timeout (Optional[float]): Seconds to wait for the result.
+
+    Returns:
+        Any: The coroutine's result.
+    """
+    return get_event_loop_thread().run(coro, timeout)
@@ -0,0 +1,291 @@
+from requests.exceptions import ChunkedEncodingError
+from concurrent.futures import ThreadPoolExecutor
+from requests.exceptions import ConnectionError
+from requests.exceptions import HTTPError
+from requests.exceptions import Timeout
+from requests.adapters import HTTPAdapter
+from src.utils.metrics import get_metrics
+from src.config.logging import logger
+from urllib.parse import urlparse
+from collections import defaultdict
+from collections import Counter
+from typing import Optional
+from typing import Tuple
+from typing import List
+from typing import Dict
+from typing import Any
+from tqdm import tqdm
+import threading
+import requests
+import hashlib
+import sqlite3
+import shutil
+import json
+import time
+import os
+
+
+# Bytes written per read from the response stream
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Suffix of files that are still being downloaded
+PARTIAL_SUFFIX = ".part"
+# Suffix of the file keeping the ETag and Last-Modified a partial file was downloaded with
+VALIDATOR_SUFFIX = ".validator"
+# Layout of the download directory
+OBJECTS_DIR = "objects"
+PARTIAL_DIR = "partial"
+METADATA_FILE = "metadata.sqlite"
+
+DOWNLOADED = "downloaded"
+NOT_MODIFIED = "not_modified"
+DEDUPLICATED = "deduplicated"
+FAILED = "failed"
+
+RETRYABLE_ERRORS = (ConnectionError, HTTPError, Timeout, ChunkedEncodingError)
+
+
+class DownloadMetadataStore:
+    """
+    SQLite-backed record of the ETag, Last-Modified, size and SHA-256 of each downloaded URL.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS downloads ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+            "size INTEGER NOT NULL, sha256 TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT etag, last_modified, size, sha256 FROM downloads WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "size": row[2], "sha256": row[3]}
+
+    def set(self, url: str, etag: Optional[str], last_modified: Optional[str], size: int, sha256: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO downloads (url, etag, last_modified, size, sha256, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, size, sha256, time.time())
+            )
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class PdfDownloader:
+    """
+    Concurrent file downloader with global and per-host concurrency limits.
+
+    Files are stored once per distinct content under `objects/<sha256[:2]>/<sha256><ext>` in
+    the download directory, and each requested file path is a hard link to its object
+    (or a copy where links are not supported). Known URLs are fetched with conditional
+    requests and skipped on 304 Not Modified.
+
+    Responses are streamed to a `.part` file which is moved into place once complete.
+    An interrupted download resumes from the partial file with an HTTP Range request, guarded
+    by If-Range so a file that changed in the meantime is downloaded again from the start.
+    """
+
+    def __init__(self, save_dir: str, max_workers: int = 8, per_host: int = 2, timeout: float = 30.0, retries: int = 3):
+        """
+        Args:
+            save_dir (str): The download directory holding the object store and metadata.
+            max_workers (int): Maximum number of downloads in flight.
+            per_host (int): Maximum number of downloads in flight per host.
+            timeout (float): Connect and read timeout in seconds.
+            retries (int): Attempts per file.
+        """
+        self.save_dir = save_dir
+        self.objects_dir = os.path.join(save_dir, OBJECTS_DIR)
+        self.partial_dir = os.path.join(save_dir, PARTIAL_DIR)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        self.metadata = DownloadMetadataStore(os.path.join(save_dir, METADATA_FILE))
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._host_semaphores = defaultdict(lambda: threading.BoundedSemaphore(self.per_host))
+        self._host_lock = threading.Lock()
+
+    def _host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        with self._host_lock:
+            return self._host_semaphores[urlparse(url).netloc]
+
+    def _object_path(self, sha256: str, filepath: str) -> str:
+        extension = os.path.splitext(filepath)[1]
+        return os.path.join(self.objects_dir, sha256[:2], f"{sha256}{extension}")
+
+    def _link(self, object_path: str, filepath: str) -> None:
+        """Points `filepath` at a stored object, replacing whatever was there."""
+        if os.path.exists(filepath) and os.path.samefile(object_path, filepath):
+            return
+        temp_path = f"{filepath}.{threading.get_ident()}.tmp"
+        try:
+            os.link(object_path, temp_path)
+        except OSError:
+            shutil.copyfile(object_path, temp_path)
+        os.replace(temp_path, filepath)
+
+    @staticmethod
+    def _read_validator(validator_path: str) -> Optional[str]:
+        """Returns the If-Range value for resuming a partial file: its strong ETag, else its Last-Modified date."""
+        try:
+            with open(validator_path, "r", encoding="utf-8") as file:
+                validator = json.load(file)
+        except (OSError, ValueError):
+            return None
+        etag = validator.get("etag")
+        if etag and not etag.startswith("W/"):  # If-Range only accepts strong ETags
+            return etag
+        return validator.get("last_modified")
+
+    @staticmethod
+    def _discard_partial(partial_path: str, validator_path: str) -> None:
+        for path in (partial_path, validator_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _fetch(self, url: str, filepath: str) -> str:
+        known = self.metadata.get(url)
+        object_path = self._object_path(known["sha256"], filepath) if known else None
+        partial_path = os.path.join(self.partial_dir, hashlib.sha256(f"{url}\0{filepath}".encode("utf-8")).hexdigest() + PARTIAL_SUFFIX)
+        validator_path = partial_path + VALIDATOR_SUFFIX
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        if_range = self._read_validator(validator_path) if offset else None
+        if offset and not if_range:
+            # Without a validator there is no telling whether the remote file is the one the partial file came from
+            self._discard_partial(partial_path, validator_path)
+            offset = 0
+
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = if_range
+        elif known and os.path.exists(object_path):
+            if known["etag"]:
+                headers["If-None-Match"] = known["etag"]
+            if known["last_modified"]:
+                headers["If-Modified-Since"] = known["last_modified"]
+
+        with self.session.get(url, stream=True, timeout=self.timeout, headers=headers) as response:
+            if response.status_code == 304:
+                self._link(object_path, filepath)
+                return NOT_MODIFIED
+            if response.status_code == 416 and offset:
+                # The partial file does not match the remote file any more; start over.
+                self._discard_partial(partial_path, validator_path)
+                raise HTTPError(f"Range not satisfiable for {url}, restarting download", response=response)
+            response.raise_for_status()
+            if response.status_code == 206 and not response.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+                self._discard_partial(partial_path, validator_path)
+                raise HTTPError(f"Unexpected Content-Range for {url}, restarting download", response=response)
+
+            digest = hashlib.sha256()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if offset and response.status_code == 206:
+                mode = "ab"
+                with open(partial_path, "rb") as file:
+                    for block in iter(lambda: file.read(DOWNLOAD_CHUNK_SIZE), b""):
+                        digest.update(block)
+            else:
+                # A 200 is the whole file, either fresh or because If-Range found it changed
+                mode = "wb"
+                with open(validator_path, "w", encoding="utf-8") as file:
+                    json.dump({"etag": etag, "last_modified": last_modified}, file)
+            with open(partial_path, mode) as file:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    file.write(chunk)
+
+        if os.path.exists(validator_path):
+            os.remove(validator_path)
+        sha256 = digest.hexdigest()
+        size = os.path.getsize(partial_path)
+        object_path = self._object_path(sha256, filepath)
+        if os.path.exists(object_path):
+            os.remove(partial_path)
+            status = DEDUPLICATED
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(partial_path, object_path)
+            status = DOWNLOADED
+        self._link(object_path, filepath)
+        self.metadata.set(url, etag, last_modified, size, sha256)
+        return status
+
+    def download(self, url: str, filepath: str) -> str:
+        """
+        Downloads one file, retrying with exponential backoff. The per-host slot is
+        released while backing off so other downloads can use it.
+
+        Args:
+            url (str): The file URL.
+            filepath (str): Where to save the file.
+
+        Returns:
+            str: 'downloaded', 'not_modified', 'deduplicated' or 'failed'.
+        """
+        metrics = get_metrics()
+        for attempt in range(1, self.retries + 1):
+            try:
+                with self._host_semaphore(url), metrics.track("http.download"):
+                    status = self._fetch(url, filepath)
+                metrics.inc(status, "http.download")
+                return status
+            except RETRYABLE_ERRORS as e:
+                logger.error(f"Attempt {attempt} failed for {url}: {e}")
+                if attempt < self.retries:
+                    metrics.record_retry("http.download")
+                    time.sleep(2 ** attempt)  # Exponential backoff
+            except Exception as e:
+                logger.error(f"Unexpected error occurred for {url}: {e}")
+                break  # Break on unknown errors
+
+        metrics.inc(FAILED, "http.download")
+        logger.error(f"Failed to download after {self.retries} attempts: {url}")
+        return FAILED
+
+    def download_all(self, items: List[Tuple[str, str]]) -> Dict[str, str]:
+        """
+        Downloads many files concurrently.
+
+        Args:
+            items (List[Tuple[str, str]]): (url, filepath) pairs. Later pairs with an already seen filepath are ignored.
+
+        Returns:
+            Dict[str, str]: The download status of each filepath.
+        """
+        targets = {}
+        for url, filepath in items:
+            targets.setdefault(filepath, url)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [(filepath, executor.submit(self.download, url, filepath)) for filepath, url in targets.items()]
+            for filepath, future in tqdm(futures, desc="Downloading PDFs"):
+                results[filepath] = future.result()
+
+        counts = Counter(results.values())
+        logger.info(f"Downloads: {counts[DOWNLOADED]} downloaded, {counts[NOT_MODIFIED]} not modified, "
+                    f"{counts[DEDUPLICATED]} deduplicated, {counts[FAILED]} failed.")
+        return results
+
+    def close(self) -> None:
+        self.session.close()
+        self.metadata.close()
@@ -1,12 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.metrics import get_metrics
 from src.config.logging import logger
 from google.cloud import storage
 from src.config.setup import *
+from typing import Optional
+from datetime import timedelta
+from datetime import timezone
+from datetime import datetime
+from typing import Dict
+from typing import List
 from tqdm import tqdm
+import threading
+import hashlib
+import base64
+import time
+import os
+
+
+UPLOADED = "uploaded"
+COPIED = "copied"
+FAILED = "failed"
+
+# Maximum number of operations the GCS JSON API accepts in one batch request
+DELETE_BATCH_SIZE = 100
+
+_storage_client = None
+_storage_client_lock = threading.Lock()
+
+
+def get_storage_client() -> storage.Client:
+    """Returns the process-wide storage client, creating it on first use."""
+    global _storage_client
+    with _storage_client_lock:
+        if _storage_client is None:
+            config.load()  # Credentials must be in the environment before the client is created
+            _storage_client = storage.Client()
+        return _storage_client
+
+
+def set_storage_client(client: Optional[storage.Client]) -> None:
+    """Replaces the process-wide storage client, e.g. with a local stand-in. None resets it."""
+    global _storage_client
+    with _storage_client_lock:
+        _storage_client = client
 
 
 def upload_to_gcs(bucket_name: str, source_file_path: str, destination_blob_name: str):
     """Uploads a file to the bucket."""
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
     bucket = storage_client.bucket(bucket_name)
     blob = bucket.blob(destination_blob_name)
 
@@ -17,15 +58,155 @@ def upload_to_gcs(bucket_name: str, source_file_path: str, destination_blob_name
         logger.error(f"Failed to upload file to GCS: {e}")
 
 
-def flush_bucket(bucket_name: str):
-    """Deletes all objects within the specified bucket."""
-    storage_client = storage.Client()
+def compute_md5(file_path: str) -> str:
+    """Returns the base64-encoded MD5 of a local file, in the format GCS reports as `md5_hash`."""
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            md5.update(block)
+    return base64.b64encode(md5.digest()).decode('utf-8')
+
+
+def list_object_hashes(bucket_name: str, prefix: str) -> Dict[str, str]:
+    """Returns the MD5 hash of every object under a prefix, keyed by file name."""
+    prefix = f"{prefix.rstrip('/')}/"
+    blobs = get_storage_client().list_blobs(bucket_name, prefix=prefix)
+    return {blob.name[len(prefix):]: blob.md5_hash for blob in blobs}
+
+
+def upload_directory_to_gcs(local_dir: str, bucket_name: str, prefix: str, max_workers: Optional[int] = None,
+                            reference_prefix: Optional[str] = None) -> Dict[str, int]:
+    """
+    Uploads every file in a local directory to `prefix/` in the bucket on a thread pool.
+
+    The destination is expected to be a new prefix, e.g. a fresh timestamp folder. If a
+    reference prefix (e.g. the previous run) holds an object with the same MD5, it is copied
+    server-side instead of being uploaded again.
+
+    Args:
+        local_dir (str): The directory to upload.
+        bucket_name (str): The destination bucket.
+        prefix (str): The destination prefix.
+        max_workers (Optional[int]): Number of concurrent uploads. Defaults to `upload_max_workers` from the config.
+        reference_prefix (Optional[str]): A prefix to copy unchanged files from.
+
+    Returns:
+        Dict[str, int]: The number of files uploaded, copied and failed.
+    """
+    max_workers = max_workers or config.UPLOAD_MAX_WORKERS
+    prefix = prefix.rstrip('/')
+    bucket = get_storage_client().bucket(bucket_name)
+    metrics = get_metrics()
+    reference = {}
+    if reference_prefix:
+        with metrics.track("gcs.list"):
+            reference = list_object_hashes(bucket_name, reference_prefix)
+
+    def upload(filename: str) -> str:
+        source_file_path = os.path.join(local_dir, filename)
+        destination_blob_name = f"{prefix}/{filename}"
+        try:
+            md5 = compute_md5(source_file_path)
+            if reference.get(filename) == md5:
+                source_blob = bucket.blob(f"{reference_prefix.rstrip('/')}/{filename}")
+                with metrics.track("gcs.copy"):
+                    bucket.copy_blob(source_blob, bucket, destination_blob_name)
+                return COPIED
+            blob = bucket.blob(destination_blob_name)
+            with metrics.track("gcs.upload"):
+                blob.upload_from_filename(source_file_path)
+            return UPLOADED
+        except Exception as e:
+            logger.error(f"Failed to upload {source_file_path} to GCS: {e}")
+            return FAILED
+
+    filenames = sorted(f for f in os.listdir(local_dir) if os.path.isfile(os.path.join(local_dir, f)))
+    counts = {UPLOADED: 0, COPIED: 0, FAILED: 0}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for status in tqdm(executor.map(upload, filenames), total=len(filenames), desc=f"Uploading to {bucket_name}/{prefix}"):
+            counts[status] += 1
+
+    logger.info(f"Upload to {bucket_name}/{prefix} finished: {counts[UPLOADED]} uploaded, {counts[COPIED]} copied, "
+                f"{counts[FAILED]} failed.")
+    return counts
+
+
+def delete_blobs_batch(blobs: List[storage.Blob]) -> int:
+    """
+    Deletes blobs in a single batched request. Objects that are already gone count as deleted;
+    any other failed deletion is logged and left out of the count.
+
+    Args:
+        blobs (List[storage.Blob]): The blobs to delete, at most `DELETE_BATCH_SIZE`.
+
+    Returns:
+        int: The number of blobs deleted.
+    """
+    metrics = get_metrics()
+    with metrics.track("gcs.delete_batch"):
+        batch = get_storage_client().batch(raise_exception=False)
+        with batch:
+            for blob in blobs:
+                blob.delete()
+
+    # Deletions only go into the batch while it is the client's current batch, which the public API
+    # allows only inside `with batch`, and leaving the block sends the request and discards what
+    # `finish()` returns. Calling `finish()` inside the block would send every deletion twice.
+    # So the per-deletion responses, one per deletion in request order, are read from
+    # `_responses`, where `finish()` also stores them. That attribute is private, so
+    # google-cloud-storage is pinned in requirements.txt; check it still exists before upgrading.
+    deleted = 0
+    for blob, response in zip(blobs, batch._responses):
+        if 200 <= response.status_code < 300 or response.status_code == 404:
+            deleted += 1
+        else:
+            metrics.record_error("gcs.delete_batch")
+            logger.error(f"Failed to delete gs://{blob.bucket.name}/{blob.name}: HTTP {response.status_code}")
+    return deleted
+
+
+def flush_bucket(bucket_name: str, prefix: Optional[str] = None, older_than_days: Optional[int] = None,
+                 batch_size: int = DELETE_BATCH_SIZE) -> int:
+    """
+    Deletes objects within the specified bucket.
+
+    Listing pages are streamed and deletions are sent in batched requests, so memory use
+    stays flat however many objects the bucket holds.
+
+    Args:
+        bucket_name (str): The bucket to flush.
+        prefix (Optional[str]): Only delete objects under this prefix.
+        older_than_days (Optional[int]): Only delete objects created more than this many days ago.
+        batch_size (int): Deletions per batched request, at most 100.
+
+    Returns:
+        int: The number of objects deleted.
+    """
+    storage_client = get_storage_client()
     bucket = storage_client.bucket(bucket_name)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days) if older_than_days is not None else None
+    batch_size = min(batch_size, DELETE_BATCH_SIZE)
+    deleted = 0
+    start = time.perf_counter()
 
     try:
-        blobs = list(bucket.list_blobs())
-        for blob in tqdm(blobs, desc=f"Deleting objects in {bucket_name}"):
-            blob.delete()
-        logger.info(f"All objects in bucket {bucket_name} have been deleted.")
+        pending = []
+        with tqdm(desc=f"Deleting objects in {bucket_name}", unit="object") as pbar:
+            for page in bucket.list_blobs(prefix=prefix, page_size=1000).pages:
+                for blob in page:
+                    if cutoff is not None and blob.time_created >= cutoff:
+                        continue
+                    pending.append(blob)
+                    if len(pending) >= batch_size:
+                        deleted += delete_blobs_batch(pending)
+                        pbar.update(len(pending))
+                        pending = []
+            if pending:
+                deleted += delete_blobs_batch(pending)
+                pbar.update(len(pending))
+        elapsed = time.perf_counter() - start
+        rate = deleted / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Deleted {deleted} objects from bucket {bucket_name} in {elapsed:.1f}s ({rate:.1f} objects/sec).")
     except Exception as e:
         logger.error(f"Failed to flush bucket {bucket_name}: {e}")
+    return deleted
@@ -0,0 +1,246 @@
+from src.config.logging import logger
+from src.config.setup import config
+from datetime import datetime
+from typing import Callable
+from typing import Optional
+from typing import Tuple
+from typing import List
+from typing import Dict
+from typing import Any
+import contextlib
+import functools
+import threading
+import random
+import json
+import time
+import os
+
+
+# Counters kept for every operation
+CALLS = "calls"
+ERRORS = "errors"
+RETRIES = "retries"
+# Latency samples kept per operation for percentiles; older samples are replaced at random
+RESERVOIR_SIZE = 10000
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_PREFIX = "docdiscovery"
+
+
+class LatencyHistogram:
+    """
+    Latency distribution of one operation. The count, sum and maximum are exact; percentiles
+    are computed from a uniform reservoir sample of at most `RESERVOIR_SIZE` observations.
+    """
+
+    def __init__(self, reservoir_size: int = RESERVOIR_SIZE):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._reservoir_size = reservoir_size
+        self._samples: List[float] = []
+        self._random = random.Random(0)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if len(self._samples) < self._reservoir_size:
+            self._samples.append(seconds)
+        else:
+            slot = self._random.randrange(self.count)
+            if slot < self._reservoir_size:
+                self._samples[slot] = seconds
+
+    def summary(self) -> Dict[str, float]:
+        ordered = sorted(self._samples)
+        result = {"count": self.count, "sum": round(self.total, 6), "max": round(self.max, 6)}
+        for q in QUANTILES:
+            value = ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+            result[f"p{int(q * 100)}"] = round(value, 6)
+        return result
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of per-operation counters and latency histograms.
+
+    Operations are dotted names such as 'search.query', 'db.lookup' or 'stage.ingest'.
+    Every operation has call, error and retry counters; any other counter (e.g. cache hits)
+    can be added with `inc`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, str], float] = {}
+        self._histograms: Dict[str, LatencyHistogram] = {}
+
+    def inc(self, counter: str, operation: str, value: float = 1) -> None:
+        """
+        Increments a counter of an operation.
+
+        Args:
+            counter (str): The counter, e.g. 'calls', 'errors', 'retries' or 'cache_hits'.
+            operation (str): The operation name.
+            value (float): The increment.
+        """
+        with self._lock:
+            self._counters[(counter, operation)] = self._counters.get((counter, operation), 0) + value
+
+    def observe(self, operation: str, seconds: float) -> None:
+        """
+        Records the latency of one call of an operation.
+
+        Args:
+            operation (str): The operation name.
+            seconds (float): The call latency.
+        """
+        with self._lock:
+            histogram = self._histograms.get(operation)
+            if histogram is None:
+                histogram = self._histograms[operation] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def record_retry(self, operation: str) -> None:
+        self.inc(RETRIES, operation)
+
+    def record_error(self, operation: str) -> None:
+        self.inc(ERRORS, operation)
+
+    @contextlib.contextmanager
+    def track(self, operation: str):
+        """
+        Counts a call of an operation and records its latency. An exception leaving the
+        block is counted as an error and re-raised.
+
+        Args:
+            operation (str): The operation name.
+        """
+        self.inc(CALLS, operation)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc(ERRORS, operation)
+            raise
+        finally:
+            self.observe(operation, time.perf_counter() - start)
+
+    def timed(self, operation: str) -> Callable:
+        """
+        Decorator form of `track`.
+
+        Args:
+            operation (str): The operation name.
+        """
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.track(operation):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns every operation's counters and latency percentiles.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per operation, the counters and a 'latency' entry with count, sum, max, p50, p95 and p99 in seconds.
+        """
+        with self._lock:
+            operations: Dict[str, Dict[str, Any]] = {}
+            for (counter, operation), value in self._counters.items():
+                operations.setdefault(operation, {CALLS: 0, ERRORS: 0, RETRIES: 0})[counter] = value
+            for operation, histogram in self._histograms.items():
+                operations.setdefault(operation, {CALLS: 0, ERRORS: 0, RETRIES: 0})["latency"] = histogram.summary()
+        return dict(sorted(operations.items()))
+
+    def to_prometheus(self) -> str:
+        """
+        Renders all metrics in the Prometheus text exposition format. Counters become
+        `<prefix>_<counter>_total{operation="..."}` and latencies a summary with p50/p95/p99 quantiles.
+
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((operation, histogram.summary()) for operation, histogram in self._histograms.items())
+
+        lines = []
+        seen = set()
+        for (counter, operation), value in counters:
+            name = f"{METRIC_PREFIX}_{counter}_total"
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f'{name}{{operation="{operation}"}} {value}')
+
+        if histograms:
+            name = f"{METRIC_PREFIX}_latency_seconds"
+            lines.append(f"# TYPE {name} summary")
+            for operation, summary in histograms:
+                for q in QUANTILES:
+                    lines.append(f'{name}{{operation="{operation}",quantile="{q}"}} {summary[f"p{int(q * 100)}"]}')
+                lines.append(f'{name}_sum{{operation="{operation}"}} {summary["sum"]}')
+                lines.append(f'{name}_count{{operation="{operation}"}} {summary["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Returns the process-wide metrics registry, creating it on first use.
+
+    Returns:
+        MetricsRegistry: The shared registry.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+        return _registry
+
+
+def write_metrics_report(pipeline: str, output_dir: Optional[str] = None) -> Optional[str]:
+    """
+    Writes the current metrics as `<pipeline>_<timestamp>.json` and `.prom` files and logs
+    the slowest operations.
+
+    Args:
+        pipeline (str): The pipeline name, e.g. 'index' or 'query'.
+        output_dir (Optional[str]): The directory to write to. Defaults to `metrics_dir` from the config.
+
+    Returns:
+        Optional[str]: The path of the JSON summary, or None if it could not be written.
+    """
+    output_dir = output_dir or config.METRICS_DIR
+    registry = get_metrics()
+    summary = registry.summary()
+    timed_operations = [(operation, values) for operation, values in summary.items() if "latency" in values]
+    for operation, values in sorted(timed_operations, key=lambda item: -item[1]["latency"]["sum"])[:10]:
+        latency = values["latency"]
+        logger.info(f"{operation}: {values[CALLS]} calls, {values[ERRORS]} errors, {values[RETRIES]} retries, "
+                    f"p50 {latency['p50']:.3f}s, p95 {latency['p95']:.3f}s, p99 {latency['p99']:.3f}s, "
+                    f"total {latency['sum']:.1f}s")
+
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        base = os.path.join(output_dir, f"{pipeline}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}")
+        with open(f"{base}.json", "w") as file:
+            json.dump({"pipeline": pipeline, "operations": summary}, file, indent=2)
+        with open(f"{base}.prom", "w") as file:
+            file.write(registry.to_prometheus())
+        logger.info(f"Metrics written to {base}.json and {base}.prom.")
+        return f"{base}.json"
+    except OSError as e:
+        logger.error(f"Failed to write metrics for {pipeline}: {e}")
+        return None
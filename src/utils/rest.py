@@ -0,0 +1,127 @@
+from src.utils.access import get_token_provider
+from src.utils.access import create_headers
+from src.utils.metrics import get_metrics
+from requests.adapters import HTTPAdapter
+from src.config.logging import logger
+from src.config.setup import config
+from typing import Optional
+from typing import Any
+import threading
+import requests
+
+
+def discovery_engine_url(path: str, version: str = "v1alpha") -> str:
+    """
+    Builds a Discovery Engine REST URL under the project's default collection.
+
+    Args:
+        path (str): The path below the collection, e.g. 'dataStores' or 'engines'.
+        version (str): The API version.
+
+    Returns:
+        str: The full URL.
+    """
+    return (f"{config.DISCOVERY_ENGINE_ENDPOINT}/{version}/projects/{config.PROJECT_ID}"
+            f"/locations/global/collections/default_collection/{path}")
+
+
+def discovery_engine_resource_url(name: str, version: str = "v1") -> str:
+    """
+    Builds a Discovery Engine REST URL for a fully qualified resource name.
+
+    Args:
+        name (str): The resource name, e.g. 'projects/.../dataStores/1_50'.
+        version (str): The API version.
+
+    Returns:
+        str: The full URL.
+    """
+    return f"{config.DISCOVERY_ENGINE_ENDPOINT}/{version}/{name}"
+
+
+class RestClient:
+    """
+    Authenticated REST client backed by a pooled keep-alive `requests.Session`.
+    """
+
+    def __init__(self, pool_size: int = 10, timeout: float = 30.0):
+        """
+        Args:
+            pool_size (int): Maximum number of pooled connections per host.
+            timeout (float): Default per-call timeout in seconds.
+        """
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method: str, url: str, timeout: Optional[float] = None, **kwargs: Any) -> requests.Response:
+        """
+        Sends an authenticated request. A 401 response drops the cached access
+        token and the request is retried once with a fresh one.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The request URL.
+            timeout (Optional[float]): Per-call timeout in seconds, defaults to the client timeout.
+            **kwargs: Passed through to `requests.Session.request`.
+
+        Returns:
+            requests.Response: The response.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        metrics = get_metrics()
+        operation = f"rest.{method.lower()}"
+        with metrics.track(operation):
+            response = self.session.request(method, url, headers=create_headers(), timeout=timeout, **kwargs)
+            if response.status_code == 401:
+                logger.info("Access token rejected, retrying with a fresh token.")
+                metrics.record_retry(operation)
+                get_token_provider().invalidate()
+                response = self.session.request(method, url, headers=create_headers(), timeout=timeout, **kwargs)
+        if response.status_code >= 400:
+            metrics.record_error(operation)
+        return response
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_rest_client() -> RestClient:
+    """
+    Returns the process-wide REST client, creating it on first use.
+
+    Returns:
+        RestClient: The shared REST client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = RestClient(pool_size=config.HTTP_POOL_SIZE, timeout=config.HTTP_TIMEOUT)
+        return _client
+
+
+def set_rest_client(client: Optional[RestClient]) -> None:
+    """
+    Replaces the process-wide REST client. None resets it, so the next call builds a new one from the config.
+
+    Args:
+        client (Optional[RestClient]): The client to use.
+    """
+    global _client
+    with _client_lock:
+        _client = client
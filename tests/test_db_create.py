@@ -0,0 +1,62 @@
+from src.utils.db import create_engine_with_connection_pool
+from src.db.create import upsert_entity_urls
+from src.db.create import create_table
+from src.config.setup import config
+from sqlalchemy import text
+import tempfile
+import unittest
+import shutil
+import os
+
+
+ROWS = [
+    {"entity": "Stanford University", "url": "https://www.stanford.edu/handbook.pdf", "country": "US"},
+    {"entity": "University of Oxford", "url": None, "country": "UK"},
+    {"entity": "University of Tokyo", "url": "https://www.u-tokyo.ac.jp/handbook.pdf", "country": "JP"},
+]
+
+
+class UpsertEntityUrlsTest(unittest.TestCase):
+    """A row the database rejects must not discard the rest of its batch."""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.engine = create_engine_with_connection_pool(f"sqlite:///{os.path.join(self.workdir, 'entity_urls.sqlite')}")
+        create_table(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.workdir)
+
+    def upsert(self, rows, **kwargs):
+        rows = [{**row, "batch_id": "0001_0050", "created_at": "2024-01-01 00:00:00", "cloud_storage_uri": None} for row in rows]
+        return upsert_entity_urls(self.engine, rows, **kwargs)
+
+    def stored_rows(self):
+        with self.engine.connect() as connection:
+            return dict(connection.execute(text(f"SELECT entity, url FROM {config.CLOUD_SQL_TABLE}")).fetchall())
+
+    def test_bad_row_falls_back_to_row_by_row(self):
+        written = self.upsert(ROWS)
+
+        self.assertEqual([row["entity"] for row in written], ["Stanford University", "University of Tokyo"])
+        self.assertEqual(self.stored_rows(), {row["entity"]: row["url"] for row in ROWS if row["url"]})
+
+    def test_existing_rows_are_updated(self):
+        self.upsert([ROWS[0]])
+        moved = {**ROWS[0], "url": "https://www.stanford.edu/new-handbook.pdf"}
+        written = self.upsert([moved, ROWS[1]])
+
+        self.assertEqual([row["entity"] for row in written], ["Stanford University"])
+        self.assertEqual(self.stored_rows(), {"Stanford University": moved["url"]})
+
+    def test_unindexed_rows_have_no_content_hash(self):
+        self.upsert([ROWS[0]], indexed=False)
+
+        with self.engine.connect() as connection:
+            content_hash = connection.execute(text(f"SELECT content_hash FROM {config.CLOUD_SQL_TABLE}")).scalar_one()
+        self.assertIsNone(content_hash)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+from src.utils.download import VALIDATOR_SUFFIX
+from src.utils.download import PARTIAL_SUFFIX
+from src.utils.download import PdfDownloader
+from src.utils.download import NOT_MODIFIED
+from src.utils.download import DOWNLOADED
+from requests.exceptions import HTTPError
+from unittest import mock
+import src.utils.download as download
+import tempfile
+import unittest
+import hashlib
+import shutil
+import json
+import os
+
+
+URL = "https://www.stanford.edu/handbook.pdf"
+ETAG = '"v1"'
+CONTENT = b"%PDF-1.4 graduate handbook"
+
+
+def make_response(status_code, body=b"", headers=None):
+    response = mock.MagicMock()
+    response.__enter__.return_value = response
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.iter_content.return_value = [body] if body else []
+    if status_code >= 400:
+        response.raise_for_status.side_effect = HTTPError(f"HTTP {status_code}", response=response)
+    return response
+
+
+class PdfDownloaderResumeTest(unittest.TestCase):
+    """Interrupted downloads resume with Range and If-Range, and stale partial files are discarded."""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.downloader = PdfDownloader(self.workdir, retries=2)
+        self.filepath = os.path.join(self.workdir, "Stanford_University.pdf")
+        self.partial_path = os.path.join(
+            self.downloader.partial_dir,
+            hashlib.sha256(f"{URL}\0{self.filepath}".encode("utf-8")).hexdigest() + PARTIAL_SUFFIX
+        )
+        self.validator_path = self.partial_path + VALIDATOR_SUFFIX
+        patcher = mock.patch.object(download.time, "sleep")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.downloader.close()
+        shutil.rmtree(self.workdir)
+
+    def write_partial(self, data, etag=ETAG):
+        with open(self.partial_path, "wb") as file:
+            file.write(data)
+        if etag is not None:
+            with open(self.validator_path, "w", encoding="utf-8") as file:
+                json.dump({"etag": etag, "last_modified": None}, file)
+
+    def download(self, *responses):
+        with mock.patch.object(self.downloader.session, "get", side_effect=list(responses)) as get:
+            status = self.downloader.download(URL, self.filepath)
+        return status, [call.kwargs["headers"] for call in get.call_args_list]
+
+    def assert_downloaded(self, status):
+        self.assertEqual(status, DOWNLOADED)
+        with open(self.filepath, "rb") as file:
+            self.assertEqual(file.read(), CONTENT)
+        self.assertFalse(os.path.exists(self.partial_path))
+        self.assertFalse(os.path.exists(self.validator_path))
+
+    def test_partial_response_is_appended(self):
+        self.write_partial(CONTENT[:8])
+        status, headers = self.download(
+            make_response(206, CONTENT[8:], {"ETag": ETAG, "Content-Range": f"bytes 8-{len(CONTENT) - 1}/{len(CONTENT)}"})
+        )
+
+        self.assert_downloaded(status)
+        self.assertEqual(headers, [{"Range": "bytes=8-", "If-Range": ETAG}])
+
+    def test_changed_file_is_downloaded_again_from_the_start(self):
+        self.write_partial(b"stale bytes")
+        status, headers = self.download(make_response(200, CONTENT, {"ETag": '"v2"'}))
+
+        self.assert_downloaded(status)
+        self.assertEqual(headers[0]["If-Range"], ETAG)
+
+    def test_unsatisfiable_range_discards_the_partial_file(self):
+        self.write_partial(CONTENT + b" trailing bytes")
+        status, headers = self.download(make_response(416), make_response(200, CONTENT, {"ETag": ETAG}))
+
+        self.assert_downloaded(status)
+        self.assertIn("Range", headers[0])
+        self.assertEqual(headers[1], {})
+
+    def test_unexpected_content_range_discards_the_partial_file(self):
+        self.write_partial(CONTENT[:8])
+        status, headers = self.download(
+            make_response(206, CONTENT, {"ETag": ETAG, "Content-Range": f"bytes 0-{len(CONTENT) - 1}/{len(CONTENT)}"}),
+            make_response(200, CONTENT, {"ETag": ETAG}),
+        )
+
+        self.assert_downloaded(status)
+        self.assertEqual(headers[1], {})
+
+    def test_partial_file_without_validator_is_discarded(self):
+        self.write_partial(CONTENT[:8], etag=None)
+        status, headers = self.download(make_response(200, CONTENT, {"ETag": ETAG}))
+
+        self.assert_downloaded(status)
+        self.assertEqual(headers, [{}])
+
+    def test_unchanged_file_is_revalidated(self):
+        self.download(make_response(200, CONTENT, {"ETag": ETAG}))
+        status, headers = self.download(make_response(304))
+
+        self.assertEqual(status, NOT_MODIFIED)
+        self.assertEqual(headers, [{"If-None-Match": ETAG}])
+        with open(self.filepath, "rb") as file:
+            self.assertEqual(file.read(), CONTENT)
+
+
+if __name__ == "__main__":
+    unittest.main()
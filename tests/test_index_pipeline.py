@@ -0,0 +1,78 @@
+from src.utils.db import create_engine_with_connection_pool
+from src.run.index_pipeline import BATCH_COMPLETED
+from src.run.index_pipeline import BATCH_SKIPPED
+from src.run.index_pipeline import BATCH_FAILED
+from src.run.index_pipeline import process_blob
+from src.db.create import create_table
+from src.utils.db import set_engine
+from types import SimpleNamespace
+from unittest import mock
+import src.run.index_pipeline as index_pipeline
+import tempfile
+import unittest
+import shutil
+import os
+
+
+BATCH_ID = "0001_0050"
+ROWS = [
+    {"entity": "Stanford University", "url": "https://www.stanford.edu/handbook.pdf", "country": "US"},
+    {"entity": "University of Oxford", "url": "https://www.ox.ac.uk/handbook.pdf", "country": "UK"},
+]
+
+
+def accept_all(site_urls, batch_id):
+    return {site_url: None for site_url in site_urls}
+
+
+class ProcessBlobRetryTest(unittest.TestCase):
+    """A batch whose indexing fails must not be marked unchanged, so the next run indexes it again."""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.engine = create_engine_with_connection_pool(f"sqlite:///{os.path.join(self.workdir, 'entity_urls.sqlite')}")
+        set_engine(self.engine)
+        create_table(self.engine)
+        self.blob = SimpleNamespace(name=f"2024-01-01_00-00-00/batch_{BATCH_ID}.jsonl")
+        contents = [{**row, "batch_id": BATCH_ID, "cloud_storage_uri": f"gs://bucket/{self.blob.name}"} for row in ROWS]
+        patcher = mock.patch.object(index_pipeline, "parse_blob_contents", side_effect=lambda *args: iter(contents))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        set_engine(None)
+        self.engine.dispose()
+        shutil.rmtree(self.workdir)
+
+    def run_blob(self):
+        return process_blob(self.blob, "bucket", self.engine)
+
+    def test_batch_is_reindexed_after_search_app_failure(self):
+        with mock.patch.object(index_pipeline, "create_data_store") as create_data_store, \
+             mock.patch.object(index_pipeline, "submit_target_sites", side_effect=accept_all) as submit_target_sites, \
+             mock.patch.object(index_pipeline, "create_search_app", side_effect=[None, {"name": BATCH_ID}]) as create_search_app:
+            self.assertEqual(self.run_blob(), BATCH_FAILED)
+            self.assertEqual(self.run_blob(), BATCH_COMPLETED)
+            self.assertEqual(self.run_blob(), BATCH_SKIPPED)
+
+        self.assertEqual(create_data_store.call_count, 2)
+        self.assertEqual(create_search_app.call_count, 2)
+        self.assertEqual(sorted(submit_target_sites.call_args_list[1].args[0]), sorted(row["url"] for row in ROWS))
+
+    def test_failed_target_sites_are_retried(self):
+        failed_url = ROWS[1]["url"]
+        first_results = {ROWS[0]["url"]: None, failed_url: "HTTP 400: invalid"}
+        with mock.patch.object(index_pipeline, "create_data_store") as create_data_store, \
+             mock.patch.object(index_pipeline, "submit_target_sites", side_effect=[first_results, {failed_url: None}]) as submit_target_sites, \
+             mock.patch.object(index_pipeline, "create_search_app", return_value={"name": BATCH_ID}) as create_search_app:
+            self.assertEqual(self.run_blob(), BATCH_FAILED)
+            self.assertEqual(self.run_blob(), BATCH_COMPLETED)
+            self.assertEqual(self.run_blob(), BATCH_SKIPPED)
+
+        self.assertEqual(create_data_store.call_count, 1)
+        self.assertEqual(create_search_app.call_count, 1)
+        self.assertEqual(submit_target_sites.call_args_list[1].args[0], [failed_url])
+
+
+if __name__ == "__main__":
+    unittest.main()
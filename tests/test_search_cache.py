@@ -0,0 +1,71 @@
+from src.search.cache import EVICTION_INTERVAL
+from src.search.cache import SearchCache
+from unittest import mock
+import src.search.cache as cache_module
+import tempfile
+import unittest
+import shutil
+import os
+
+
+SPEC = "{}"
+RESULTS = [{"title": "Graduate Handbook", "snippet": "", "link": "https://www.stanford.edu/handbook.pdf"}]
+
+
+class SearchCacheTest(unittest.TestCase):
+    """Entries expire after the TTL, and the least recently used ones are evicted once the cache is full."""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.now = 1_000_000.0
+        patcher = mock.patch.object(cache_module.time, "time", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def open_cache(self, **kwargs):
+        cache = SearchCache(os.path.join(self.workdir, "search.sqlite"), **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def count(self, cache):
+        return cache._connection.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+
+    def test_entries_expire_after_ttl(self):
+        cache = self.open_cache(ttl=60)
+        cache.set("Graduate  Handbook", "0001_0050", 10, SPEC, RESULTS)
+
+        self.now += 60
+        self.assertEqual(cache.get("graduate handbook", "0001_0050", 10, SPEC), RESULTS)
+        self.now += 1
+        self.assertIsNone(cache.get("graduate handbook", "0001_0050", 10, SPEC))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+
+        self.assertEqual(cache.purge_expired(), 1)
+        self.assertEqual(self.count(cache), 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        max_entries = EVICTION_INTERVAL // 2
+        cache = self.open_cache(max_entries=max_entries)
+        for i in range(EVICTION_INTERVAL - 1):
+            self.now += 1
+            cache.set(f"query {i}", "0001_0050", 10, SPEC, RESULTS)
+        # Reading the oldest entry makes it the most recently used
+        self.now += 1
+        self.assertIsNotNone(cache.get("query 0", "0001_0050", 10, SPEC))
+        self.assertEqual(self.count(cache), EVICTION_INTERVAL - 1)
+
+        self.now += 1
+        cache.set("last query", "0001_0050", 10, SPEC, RESULTS)
+
+        self.assertEqual(self.count(cache), max_entries)
+        self.assertIsNotNone(cache.get("query 0", "0001_0050", 10, SPEC))
+        self.assertIsNotNone(cache.get("last query", "0001_0050", 10, SPEC))
+        self.assertIsNone(cache.get("query 1", "0001_0050", 10, SPEC))
+        self.assertIsNotNone(cache.get(f"query {EVICTION_INTERVAL - 2}", "0001_0050", 10, SPEC))
+
+
+if __name__ == "__main__":
+    unittest.main()